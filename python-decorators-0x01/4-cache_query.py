@@ -1,6 +1,32 @@
+import asyncio
+import copy
 import sqlite3
 import functools
+import hashlib
+import inspect
+import os
+import pickle
+import re
+import sys
+import threading
 import time
+import weakref
+import zlib
+from collections import OrderedDict
+
+
+class TracedConnection(sqlite3.Connection):
+    """
+    sqlite3 connection that remembers its trace callback, which sqlite3 has
+    no way to report, so @transactional can chain to it and put it back.
+    Open one with sqlite3.connect(path, factory=TracedConnection).
+    """
+    trace_callback = None
+
+    def set_trace_callback(self, callback):
+        super().set_trace_callback(callback)
+        self.trace_callback = callback
+
 
 def with_db_connection(func):
     """
@@ -11,7 +37,7 @@ def with_db_connection(func):
     def wrapper(*args, **kwargs):
         conn = None
         try:
-            conn = sqlite3.connect('users.db')
+            conn = sqlite3.connect('users.db', factory=TracedConnection)
             # Pass the connection as the first argument to the decorated function
             result = func(conn, *args, **kwargs)
             return result
@@ -31,19 +57,58 @@ def transactional(func):
     It assumes the decorated function receives a 'conn' (connection) object
     as its first argument. If the function executes successfully, the transaction
     is committed; otherwise, it is rolled back.
+    The tables written during the transaction are recorded from the statements
+    sqlite runs, and cached query results that read any of them are
+    invalidated (see cache_query) after the commit, and after a rollback too,
+    since results cached inside the transaction saw its uncommitted writes.
+    A statement that is neither a read nor a write tables_written()
+    understands invalidates everything; a transaction that only read
+    invalidates nothing.
+    A trace callback already set on a TracedConnection keeps receiving every
+    statement and is restored afterwards. A plain sqlite3 connection cannot
+    report its callback, so one set there is removed by the transaction.
     """
     @functools.wraps(func)
     def wrapper(conn, *args, **kwargs): # 'conn' is expected as the first arg
+        written = set()
+        unknown_write = False
+        tracing = hasattr(conn, 'set_trace_callback')
+        if tracing:
+            previous = getattr(conn, 'trace_callback', None)
+
+            def trace(statement):
+                nonlocal unknown_write
+                tables = tables_written(statement)
+                if tables:
+                    written.update(tables)
+                elif not _NOT_A_WRITE.match(statement):
+                    unknown_write = True
+                if previous is not None:
+                    previous(statement)
+            conn.set_trace_callback(trace)
+
+        def invalidate():
+            # Without a statement trace there is no telling what was written.
+            if not tracing or unknown_write:
+                invalidate_tables(None)
+            elif written:
+                invalidate_tables(written)
+
         try:
             result = func(conn, *args, **kwargs)
             conn.commit() # Commit changes if function executes successfully
             print("Transaction committed successfully.")
-            return result
         except Exception as e:
             if conn:
                 conn.rollback() # Rollback changes if an error occurs
                 print(f"Transaction rolled back due to error: {e}")
+                invalidate()
             raise # Re-raise the original exception
+        finally:
+            if tracing:
+                conn.set_trace_callback(previous)
+        invalidate()
+        return result
     return wrapper
 
 def retry_on_failure(retries=3, delay=2):
@@ -69,55 +134,913 @@ def retry_on_failure(retries=3, delay=2):
         return wrapper
     return decorator
 
-# Global cache dictionary for query results
-query_cache = {}
+# Quoted SQL literals are kept as-is; any other run of whitespace becomes one space.
+_SQL_TOKEN = re.compile(r"'(?:[^']|'')*'|\"(?:[^\"]|\"\")*\"|\s+")
+
+
+def normalize_sql(query):
+    """
+    Normalizes a SQL string for use in a cache key, so that calls differing
+    only in layout (extra spaces, newlines, a trailing semicolon) share an entry.
+    """
+    if not isinstance(query, str):
+        return query
+    query = _SQL_TOKEN.sub(lambda m: m.group(0) if m.group(0)[0] in "'\"" else ' ', query)
+    return query.strip().rstrip(';').rstrip()
+
+
+def _freeze(value):
+    """
+    Turns lists, dicts and sets into hashable equivalents for use in a cache
+    key. Sets become sorted tuples so the key's repr is the same in every process.
+    """
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    if isinstance(value, (set, frozenset)):
+        return tuple(sorted((_freeze(v) for v in value), key=repr))
+    return value
+
+
+def _approx_size(value):
+    """Rough size in bytes of a query result (rows of plain Python values)."""
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(_approx_size(k) + _approx_size(v) for k, v in value.items())
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        size += sum(_approx_size(v) for v in value)
+    return size
+
+
+_IDENT = r'[`"\[]?(\w+)[`"\]]?'
+_QUALIFIED = r'(?:[`"\[]?\w+[`"\]]?\.)?' + _IDENT  # optional schema prefix
+_FROM_LIST = re.compile(r'\bFROM\s+(.+?)(?=\bWHERE\b|\bGROUP\b|\bORDER\b|\bLIMIT\b|\bHAVING\b'
+                        r'|\bUNION\b|\b(?:INNER|LEFT|RIGHT|FULL|CROSS|NATURAL)\b|\bJOIN\b|\)|;|$)',
+                        re.IGNORECASE | re.DOTALL)
+_JOIN = re.compile(rf'\bJOIN\s+{_QUALIFIED}', re.IGNORECASE)
+_WRITE = re.compile(rf'^\s*(?:INSERT(?:\s+OR\s+\w+)?\s+INTO|REPLACE\s+INTO|UPDATE(?:\s+OR\s+\w+)?'
+                    rf'|DELETE\s+FROM|DROP\s+TABLE(?:\s+IF\s+EXISTS)?|ALTER\s+TABLE)\s+{_QUALIFIED}',
+                    re.IGNORECASE)
+# Statements that cannot change table contents; see transactional.
+_NOT_A_WRITE = re.compile(r'^\s*(?:SELECT|BEGIN|COMMIT|END|ROLLBACK|SAVEPOINT|RELEASE)\b',
+                          re.IGNORECASE)
+
 
-def cache_query(func):
+def tables_read(query):
     """
-    Decorator that caches query results based on the SQL query string.
-    It assumes the SQL query is passed as a keyword argument named 'query'.
+    Returns the set of table names a SELECT reads (FROM lists and JOINs),
+    lower-cased and without schema prefixes or quoting.
     """
+    tables = set()
+    for match in _FROM_LIST.finditer(query):
+        for item in match.group(1).split(','):
+            name = re.match(_QUALIFIED, item.strip())
+            if name:
+                tables.add(name.group(name.lastindex).lower())
+    tables.update(m.group(m.lastindex).lower() for m in _JOIN.finditer(query))
+    return tables
+
+
+def tables_written(statement):
+    """Returns the set of tables an INSERT/UPDATE/DELETE/REPLACE/DROP/ALTER statement writes."""
+    match = _WRITE.match(statement)
+    return {match.group(match.lastindex).lower()} if match else set()
+
+
+# Every QueryCache, so that a commit can invalidate all of them.
+_caches = weakref.WeakSet()
+
+
+def invalidate_tables(tables):
+    """
+    Drops cached results that depend on any of 'tables' from every cache.
+    'tables=None' means the written tables are unknown and clears everything.
+    """
+    for cache in list(_caches):
+        cache.invalidate_tables(tables)
+
+
+def _expiry(now, ttl, stale_ttl):
+    """
+    Returns (expires_at, fresh_until) for an entry stored at 'now': it is
+    fresh for ttl seconds and then, with a stale_ttl, served stale for that
+    much longer. fresh_until is None when there is no stale window.
+    """
+    if ttl is None:
+        return None, None
+    if not stale_ttl:
+        return now + ttl, None
+    return now + ttl + stale_ttl, now + ttl
+
+
+class DiskCache:
+    """
+    Query results shared by every process on the host, stored in a SQLite
+    file and meant to sit behind a QueryCache as its second tier (l2=...).
+    Results are pickled, and zlib-compressed when larger than 'compress_over'
+    bytes. Invalidations are applied here and appended to a log that every
+    QueryCache using the file polls, so a write committed in one process also
+    drops the matching entries from the others' in-memory tier.
+    Results are unpickled on read, so the file must only be writable by
+    trusted processes; it is created with owner-only permissions.
+    """
+    PRUNE_EVERY = 100  # sets between clean-ups of expired entries and old log rows
+    LOG_RETENTION = 24 * 3600  # seconds invalidation records are kept
+
+    def __init__(self, path='query_cache.db', max_entries=10_000, compress_over=1024):
+        self.path = path
+        self.max_entries = max_entries
+        self.compress_over = compress_over
+        self._lock = threading.Lock()
+        self._conn = None
+        self._pid = None
+        self._sets = 0
+
+    def _connection(self):
+        """Opens the file on first use, and again after a fork."""
+        if self._conn is None or self._pid != os.getpid():
+            created = not os.path.exists(self.path)
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None,
+                                   check_same_thread=False)
+            if created:
+                os.chmod(self.path, 0o600)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS entries (
+                    key TEXT PRIMARY KEY, value BLOB NOT NULL, compressed INTEGER NOT NULL,
+                    expires_at REAL, fresh_until REAL, stored_at REAL NOT NULL);
+                CREATE TABLE IF NOT EXISTS entry_tables (
+                    key TEXT NOT NULL, table_name TEXT NOT NULL);
+                CREATE INDEX IF NOT EXISTS idx_entry_tables_table ON entry_tables (table_name);
+                CREATE INDEX IF NOT EXISTS idx_entry_tables_key ON entry_tables (key);
+                CREATE TABLE IF NOT EXISTS invalidations (
+                    seq INTEGER PRIMARY KEY AUTOINCREMENT, table_name TEXT,
+                    created_at REAL NOT NULL);
+                CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value);
+            """)
+            self._conn, self._pid = conn, os.getpid()
+        return self._conn
+
+    @staticmethod
+    def _key(key):
+        return hashlib.sha256(repr(key).encode()).hexdigest()
+
+    def _delete(self, conn, where, params=()):
+        """Deletes the entries whose keys the SELECT statement 'where' returns."""
+        conn.execute("CREATE TEMP TABLE IF NOT EXISTS doomed (key TEXT)")
+        conn.execute("DELETE FROM doomed")
+        conn.execute(f"INSERT INTO doomed {where}", params)
+        conn.execute("DELETE FROM entries WHERE key IN (SELECT key FROM doomed)")
+        conn.execute("DELETE FROM entry_tables WHERE key IN (SELECT key FROM doomed)")
+
+    def get(self, key):
+        """
+        Returns (result, expires_at, fresh_until, tables), or None if key is
+        missing, expired or cannot be unpickled.
+        """
+        with self._lock:
+            conn = self._connection()
+            row = conn.execute("SELECT value, compressed, expires_at, fresh_until FROM entries "
+                               "WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)",
+                               (self._key(key), time.time())).fetchone()
+            if row is None:
+                return None
+            tables = [t for (t,) in conn.execute(
+                "SELECT table_name FROM entry_tables WHERE key = ?", (self._key(key),))]
+        value, compressed, expires_at, fresh_until = row
+        try:
+            result = pickle.loads(zlib.decompress(value) if compressed else value)
+        except Exception:
+            return None
+        return result, expires_at, fresh_until, tables
+
+    def set(self, key, result, ttl=None, tables=('*',), stale_ttl=None):
+        """Stores result like QueryCache.set, kept for ttl plus stale_ttl seconds."""
+        data = pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL)
+        compressed = len(data) > self.compress_over
+        if compressed:
+            data = zlib.compress(data)
+        now = time.time()
+        digest = self._key(key)
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                conn.execute("BEGIN IMMEDIATE")
+                conn.execute("DELETE FROM entry_tables WHERE key = ?", (digest,))
+                expires_at, fresh_until = _expiry(now, ttl, stale_ttl)
+                conn.execute("INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?)",
+                             (digest, data, int(compressed), expires_at, fresh_until, now))
+                conn.executemany("INSERT INTO entry_tables VALUES (?, ?)",
+                                 [(digest, table) for table in tables])
+            self._sets += 1
+            if self._sets % self.PRUNE_EVERY == 0:
+                self._prune(conn, now)
+
+    def delete(self, key):
+        """Drops the entry for key, if any."""
+        digest = self._key(key)
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                conn.execute("BEGIN IMMEDIATE")
+                conn.execute("DELETE FROM entries WHERE key = ?", (digest,))
+                conn.execute("DELETE FROM entry_tables WHERE key = ?", (digest,))
+
+    def _prune(self, conn, now):
+        """Drops expired entries, the oldest entries beyond max_entries and old log rows."""
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            self._delete(conn, "SELECT key FROM entries WHERE expires_at <= ?", (now,))
+            self._delete(conn, "SELECT key FROM entries ORDER BY stored_at DESC LIMIT -1 OFFSET ?",
+                         (self.max_entries,))
+            cutoff = conn.execute("SELECT MAX(seq) FROM invalidations WHERE created_at < ?",
+                                  (now - self.LOG_RETENTION,)).fetchone()[0]
+            if cutoff is not None:
+                conn.execute("DELETE FROM invalidations WHERE seq <= ?", (cutoff,))
+                conn.execute("INSERT OR REPLACE INTO meta VALUES ('pruned_through', ?)", (cutoff,))
+
+    def invalidate_tables(self, tables):
+        """Drops entries that read any of 'tables' (all if None) and logs it for other processes."""
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                conn.execute("BEGIN IMMEDIATE")
+                if tables is None:
+                    conn.execute("DELETE FROM entries")
+                    conn.execute("DELETE FROM entry_tables")
+                    conn.execute("INSERT INTO invalidations (table_name, created_at) VALUES (NULL, ?)",
+                                 (now,))
+                    return
+                tables = sorted({t.lower() for t in tables})
+                marks = ', '.join('?' * (len(tables) + 1))
+                self._delete(conn, f"SELECT key FROM entry_tables WHERE table_name IN ({marks})",
+                             tables + ['*'])
+                conn.executemany("INSERT INTO invalidations (table_name, created_at) VALUES (?, ?)",
+                                 [(table, now) for table in tables])
+
+    def last_seq(self):
+        with self._lock:
+            return self._connection().execute(
+                "SELECT COALESCE(MAX(seq), 0) FROM invalidations").fetchone()[0]
+
+    def changes_since(self, seq):
+        """
+        Returns (latest_seq, tables) for invalidations logged after 'seq';
+        tables is None if everything must be dropped, either because a
+        clear-all was logged or because the records after 'seq' were pruned.
+        """
+        with self._lock:
+            conn = self._connection()
+            rows = conn.execute("SELECT seq, table_name FROM invalidations WHERE seq > ? "
+                                "ORDER BY seq", (seq,)).fetchall()
+            pruned = conn.execute("SELECT value FROM meta WHERE name = 'pruned_through'").fetchone()
+        if not rows:
+            return seq, set()
+        latest = rows[-1][0]
+        if (pruned and pruned[0] > seq) or any(table is None for _, table in rows):
+            return latest, None
+        return latest, {table for _, table in rows}
+
+    def clear(self):
+        """Drops every entry in the file (and, via the log, from every L1 using it)."""
+        self.invalidate_tables(None)
+
+
+class QueryCache:
+    """
+    Thread-safe LRU cache for query results, bounded by number of entries and
+    by the approximate total size of the cached results.
+    Each entry carries its own expiry time; expired entries are dropped on lookup.
+    Entries also record the tables they were read from so that writes to
+    those tables can invalidate them; '*' marks an entry that depends on
+    every table.
+
+    An entry stored with a stale_ttl stays available for that long after its
+    ttl runs out, reported as stale by lookup() so the caller can refresh it.
+
+    With l2=DiskCache(...), results are also written to that shared tier and
+    L1 misses are looked up there, promoting hits into L1. Invalidations go
+    to both tiers; invalidations made by other processes are picked up from
+    the L2 log at most 'sync_interval' seconds late. L2 is only read and
+    written outside the L1 lock, so a slow disk never blocks L1 hits.
+    """
+    def __init__(self, max_entries=1024, max_bytes=16 * 1024 * 1024, l2=None, sync_interval=1.0):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.l2_hits = 0
+        self.stale_hits = 0
+        self.l2 = l2
+        self.sync_interval = sync_interval
+        self._l2_seq = l2.last_seq() if l2 is not None else 0
+        self._synced_at = time.monotonic()
+        # Bumped by every invalidation, so a result computed before a write
+        # committed can be recognised and not stored (see set()).
+        self._generation = 0
+        self._entries = OrderedDict()  # key -> (result, size, expires_at, tables, fresh_until)
+        self._by_table = {}  # table -> set of keys
+        self._lock = threading.RLock()
+        _caches.add(self)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        with self._lock:
+            return self._lookup(key) is not None
+
+    def _lookup(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[2] is not None and entry[2] <= time.monotonic():
+            self._remove(key)
+            return None
+        return entry
+
+    def _remove(self, key):
+        _, size, _, tables, _ = self._entries.pop(key)
+        self.total_bytes -= size
+        for table in tables:
+            keys = self._by_table[table]
+            keys.discard(key)
+            if not keys:
+                del self._by_table[table]
+
+    @property
+    def generation(self):
+        """
+        Counter bumped by every invalidation, including those other
+        processes logged in L2; read it before running a query and pass it
+        to set().
+        """
+        self._sync(force=True)
+        with self._lock:
+            return self._generation
+
+    def _sync(self, force=False):
+        """Applies invalidations other processes logged in L2 since the last sync."""
+        if self.l2 is None:
+            return
+        with self._lock:
+            now = time.monotonic()
+            if not force and now - self._synced_at < self.sync_interval:
+                return
+            self._synced_at = now
+            since = self._l2_seq
+        seq, tables = self.l2.changes_since(since)
+        with self._lock:
+            if seq <= self._l2_seq:
+                return  # nothing new, or a concurrent sync already applied it
+            self._l2_seq = seq
+            if tables is None or tables:
+                self.invalidate_tables(tables, propagate=False)
+
+    def _store(self, key, result, size, expires_at, tables, fresh_until=None):
+        if key in self._entries:
+            self._remove(key)
+        if size > self.max_bytes:
+            return False
+        self._entries[key] = (result, size, expires_at, tables, fresh_until)
+        self.total_bytes += size
+        for table in tables:
+            self._by_table.setdefault(table, set()).add(key)
+        while len(self._entries) > self.max_entries or self.total_bytes > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+        return True
+
+    def lookup(self, key, count=True):
+        """
+        Returns (result, stale) for key, or None on a miss, and marks the
+        entry most recently used. With an L2 tier, an L1 miss is looked up
+        there and promoted to L1. count=False leaves the hit and miss
+        counters alone, for a second look on behalf of the same call.
+        """
+        self._sync()
+        with self._lock:
+            entry = self._lookup(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                return self._hit(entry, count)
+            if self.l2 is None:
+                if count:
+                    self.misses += 1
+                return None
+            generation = self._generation
+        found = self.l2.get(key)
+        with self._lock:
+            # An invalidation during the L2 read may have made 'found' stale.
+            if found is None or generation != self._generation:
+                if count:
+                    self.misses += 1
+                return None
+            if count:
+                self.l2_hits += 1
+            return self._hit(self._promote(key, found), count)
+
+    def _hit(self, entry, count=True):
+        fresh_until = entry[4]
+        stale = fresh_until is not None and fresh_until <= time.monotonic()
+        if count:
+            self.hits += 1
+            self.stale_hits += stale
+        return entry[0], stale
+
+    def _promote(self, key, found):
+        """Copies an entry read from L2 into L1 and returns it. Caller holds the lock."""
+        result, expires_at, fresh_until, tables = found
+        # L2 times are wall-clock, shared between processes; L1 uses monotonic time.
+        offset = time.monotonic() - time.time()
+        expires_at = expires_at + offset if expires_at is not None else None
+        fresh_until = fresh_until + offset if fresh_until is not None else None
+        size = _approx_size(result)
+        tables = frozenset(tables)
+        self._store(key, result, size, expires_at, tables, fresh_until)
+        return result, size, expires_at, tables, fresh_until
+
+    def get(self, key, default=None):
+        """Returns the cached result for key (fresh or stale), or default."""
+        found = self.lookup(key)
+        return default if found is None else found[0]
+
+    def set(self, key, result, ttl=None, tables=('*',), generation=None, stale_ttl=None):
+        """
+        Stores result under key for ttl seconds (forever if ttl is None),
+        plus stale_ttl seconds during which lookup() reports it as stale,
+        evicting least recently used entries until both limits are met.
+        Results larger than max_bytes on their own are not cached.
+        'tables' are the tables the result was read from. If 'generation'
+        (read before running the query) is given and an invalidation has
+        happened since, the result may be stale and is not stored.
+        """
+        size = _approx_size(result)
+        tables = frozenset(t.lower() for t in tables) or frozenset(('*',))
+        if generation is None:
+            with self._lock:
+                generation = self._generation
+        elif generation != self.generation:
+            return False
+        if self.l2 is not None:
+            self.l2.set(key, result, ttl, tables, stale_ttl)
+        with self._lock:
+            if generation == self._generation:
+                expires_at, fresh_until = _expiry(time.monotonic(), ttl, stale_ttl)
+                return self._store(key, result, size, expires_at, tables, fresh_until)
+        # Invalidated while L2 was being written: the copy there may be stale too.
+        if self.l2 is not None:
+            self.l2.delete(key)
+        return False
+
+    def invalidate_tables(self, tables, propagate=True):
+        """
+        Drops entries that read any of 'tables' (all entries if tables is None),
+        in L2 as well unless propagate is False.
+        """
+        with self._lock:
+            self._generation += 1
+            if tables is None:
+                self.invalidations += len(self._entries)
+                self.clear()
+            else:
+                keys = set(self._by_table.get('*', ()))
+                for table in tables:
+                    keys.update(self._by_table.get(table.lower(), ()))
+                for key in keys:
+                    self._remove(key)
+                self.invalidations += len(keys)
+        if propagate and self.l2 is not None:
+            self.l2.invalidate_tables(tables)
+            # L2 reads that began before its entries were dropped must not
+            # reach L1 either (see lookup() and set()).
+            with self._lock:
+                self._generation += 1
+
+    def clear(self):
+        """Empties L1; use l2.clear() to empty the shared tier too."""
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+            self._by_table.clear()
+            self.total_bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'bytes': self.total_bytes,
+                    'hits': self.hits, 'misses': self.misses, 'l2_hits': self.l2_hits,
+                    'stale_hits': self.stale_hits,
+                    'invalidations': self.invalidations}
+
+
+# Global cache for query results
+query_cache = QueryCache()
+
+
+def _fresh_copy(error):
+    """
+    A copy of error without a traceback, for raising one outcome in many
+    places: raising the same object again grows its traceback every time
+    and shares it between threads. Falls back to error itself if it cannot
+    be copied.
+    """
+    try:
+        return copy.copy(error).with_traceback(None)
+    except Exception:
+        return error
+
+
+class _Flight:
+    """The outcome of one in-progress call, shared with callers waiting on it."""
+    def __init__(self, done):
+        self.done = done
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Runs at most one call per key at a time. Threads asking for a key that is
+    already being computed wait for that call and receive its result, or
+    its exception, instead of running their own.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights = {}
+
+    def do(self, key, fn):
+        """Returns (result, ran) where ran is False if another thread's call was shared."""
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight(threading.Event())
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise _fresh_copy(flight.error)
+            return flight.result, False
+        try:
+            flight.result = fn()
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+        return flight.result, True
+
+
+class AsyncSingleFlight:
+    """SingleFlight for coroutines running on one event loop."""
+    def __init__(self):
+        self._flights = {}
+
+    async def do(self, key, fn):
+        """Awaits fn() once per key; returns (result, ran) like SingleFlight.do."""
+        while True:
+            flight = self._flights.get(key)
+            if flight is None:
+                break
+            await flight.done.wait()
+            if isinstance(flight.error, asyncio.CancelledError):
+                continue  # the caller running it was cancelled; take over
+            if flight.error is not None:
+                raise _fresh_copy(flight.error)
+            return flight.result, False
+
+        flight = self._flights[key] = _Flight(asyncio.Event())
+        try:
+            flight.result = await fn()
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            del self._flights[key]
+            flight.done.set()
+        return flight.result, True
+
+
+def _key_builder(func):
+    """
+    Returns make_key(args, kwargs) -> (key, query) for calls to func.
+    The key is the function (module and qualified name, so same-named
+    functions in different modules sharing a cache or an L2 file do not
+    collide), the normalized 'query' argument and every other argument
+    except the connection; query is None if func takes no 'query'.
+    """
+    signature = inspect.signature(func)
+
+    def make_key(args, kwargs):
+        bound = signature.bind(*args, **kwargs)
+        bound.apply_defaults()
+        arguments = list(bound.arguments.items())[1:]  # skip the connection
+        key = (func.__module__, func.__qualname__) + tuple(
+            (name, normalize_sql(value) if name == 'query' else _freeze(value))
+            for name, value in arguments)
+        return key, bound.arguments.get('query')
+    return make_key
+
+
+def _describe(func, key, query):
+    if query is not None:
+        return query
+    return f"{func.__name__}({', '.join(f'{name}={value!r}' for name, value in key[2:])})"
+
+
+def _dependencies(tables, query):
+    """Tables a cached result depends on: explicit, parsed from the query, or all ('*')."""
+    if tables is not None:
+        return tables
+    if isinstance(query, str):
+        return tables_read(query)
+    return ('*',)
+
+
+class _CachedError:
+    """A cached exception, raised again on every hit until the entry expires."""
+    def __init__(self, error):
+        self.error = error
+
+    def fresh(self):
+        """A copy of the error without a traceback (see _fresh_copy)."""
+        return _fresh_copy(self.error)
+
+
+def _is_empty(result):
+    return result is None or (isinstance(result, (list, tuple, dict)) and not result)
+
+
+def _unwrap(result):
+    if isinstance(result, _CachedError):
+        raise result.fresh()
+    return result
+
+
+class _CachePolicy:
+    """How cache_query and cache_query_async store the outcome of running a query."""
+    def __init__(self, store, ttl, stale_ttl, negative_ttl, cache_errors, tables):
+        self.store = store
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.negative_ttl = negative_ttl
+        self.cache_errors = cache_errors if negative_ttl is not None else ()
+        self.tables = tables
+
+    def store_result(self, key, query, result, generation):
+        """Empty results are kept for negative_ttl, without a stale window."""
+        depends_on = _dependencies(self.tables, query)
+        if self.negative_ttl is not None and _is_empty(result):
+            self.store.set(key, result, self.negative_ttl, depends_on, generation)
+        else:
+            self.store.set(key, result, self.ttl, depends_on, generation, self.stale_ttl)
+
+    def store_error(self, key, query, error, generation):
+        self.store.set(key, _CachedError(error), self.negative_ttl,
+                       _dependencies(self.tables, query), generation)
+
+
+def cache_query(func=None, *, ttl=300, cache=None, tables=None, stale_ttl=None,
+                negative_ttl=5, cache_errors=(), refresh_connect=None):
+    """
+    Decorator that caches query results.
+    The cache key is the SQL query (normalized, see normalize_sql) together
+    with every other argument except the connection, so the same SQL with
+    different bind parameters gets separate entries.
+    Results expire after 'ttl' seconds (None disables expiry) and are stored
+    in 'cache', the global query_cache by default.
+    Each result is tagged with the tables its query reads, taken from the
+    'query' argument or given as 'tables' for functions with built-in SQL;
+    committing a write to one of them through @transactional drops the entry.
+    If neither is available, any committed write drops it.
+    Concurrent misses on the same key run the query once; the other threads
+    wait for that result (or exception).
+
+    With 'stale_ttl', a result older than ttl is still returned for up to
+    stale_ttl more seconds while a background thread re-runs the query on
+    its own connection from refresh_connect(), which is then required. If
+    the refresh fails, the stale result keeps being served until it expires.
+
+    Empty results (None or an empty sequence) are cached for only
+    'negative_ttl' seconds, as are exceptions of the 'cache_errors' types,
+    which are raised again on each hit. negative_ttl=None caches empty
+    results like any other and never caches errors.
+
+    Use as @cache_query or
+    @cache_query(ttl=60, stale_ttl=300, tables=['users'], refresh_connect=connect).
+    """
+    if stale_ttl is not None and refresh_connect is None:
+        raise ValueError("cache_query: stale_ttl needs refresh_connect to open "
+                         "a connection for the background refresh")
+    if func is None:
+        return lambda f: cache_query(f, ttl=ttl, cache=cache, tables=tables, stale_ttl=stale_ttl,
+                                     negative_ttl=negative_ttl, cache_errors=cache_errors,
+                                     refresh_connect=refresh_connect)
+    store = query_cache if cache is None else cache
+    policy = _CachePolicy(store, ttl, stale_ttl, negative_ttl, cache_errors, tables)
+    make_key = _key_builder(func)
+    flights = SingleFlight()
+    refreshing = set()
+    refreshing_lock = threading.Lock()
+
+    def run(conn, args, kwargs, key, query, cache_failures=True):
+        generation = store.generation
+        try:
+            result = func(conn, *args, **kwargs)
+        except policy.cache_errors as e:
+            if cache_failures:
+                policy.store_error(key, query, e, generation)
+            raise
+        policy.store_result(key, query, result, generation)  # Store result in cache
+        return result
+
+    def refresh_in_background(args, kwargs, key, query, label):
+        with refreshing_lock:
+            if key in refreshing:
+                return
+            refreshing.add(key)
+
+        def refresh():
+            try:
+                conn = refresh_connect()
+                try:
+                    flights.do(key, lambda: run(conn, args, kwargs, key, query, cache_failures=False))
+                finally:
+                    conn.close()
+            except Exception as e:
+                print(f"--- CACHE REFRESH FAILED --- Keeping stale result for query: {label} ({e})")
+            finally:
+                with refreshing_lock:
+                    refreshing.discard(key)
+
+        threading.Thread(target=refresh, name=f"cache-refresh-{func.__name__}", daemon=True).start()
+
     @functools.wraps(func)
     def wrapper(conn, *args, **kwargs):
-        query = kwargs.get('query') # Get query from kwargs
-
-        if query in query_cache:
-            print(f"--- CACHE HIT --- Returning cached result for query: {query}")
-            return query_cache[query]
-        
-        print(f"--- CACHE MISS --- Executing query: {query}")
-        result = func(conn, *args, **kwargs)
-        query_cache[query] = result # Store result in cache
+        key, query = make_key((conn,) + args, kwargs)
+        label = _describe(func, key, query)
+
+        found = store.lookup(key)
+        if found is not None:
+            result, stale = found
+            if stale:
+                print(f"--- CACHE STALE --- Returning stale result and refreshing query: {label}")
+                refresh_in_background(args, kwargs, key, query, label)
+            else:
+                print(f"--- CACHE HIT --- Returning cached result for query: {label}")
+            return _unwrap(result)
+
+        def load():
+            # A call that just finished may have filled the entry between
+            # the lookup above and this thread becoming the leader.
+            found = store.lookup(key, count=False)
+            if found is not None:
+                print(f"--- CACHE HIT --- Returning cached result for query: {label}")
+                return _unwrap(found[0])
+            print(f"--- CACHE MISS --- Executing query: {label}")
+            return run(conn, args, kwargs, key, query)
+
+        result, ran = flights.do(key, load)
+        if not ran:
+            print(f"--- CACHE WAIT --- Shared in-flight result for query: {label}")
+        return result
+
+    wrapper.cache = store
+    return wrapper
+
+
+async def _off_loop(store, fn, *args):
+    """Calls fn(*args), on a worker thread if the cache has an L2 file to touch."""
+    if getattr(store, 'l2', None) is None:
+        return fn(*args)
+    return await asyncio.to_thread(fn, *args)
+
+
+def cache_query_async(func=None, *, ttl=300, cache=None, tables=None, stale_ttl=None,
+                      negative_ttl=5, cache_errors=(), refresh_connect=None):
+    """
+    cache_query for coroutine functions: same keys, cache, expiry,
+    invalidation, stale and negative caching, with concurrent misses on the
+    same key awaiting one call. With an L2 tier, cache reads and writes run
+    on a worker thread so the disk never blocks the loop. Stale results are
+    refreshed in a task on the running loop, on a connection from
+    refresh_connect(), which stale_ttl requires; it may return the
+    connection or an awaitable of it (as aiosqlite.connect does), and a
+    close() coroutine is awaited.
+    """
+    if stale_ttl is not None and refresh_connect is None:
+        raise ValueError("cache_query_async: stale_ttl needs refresh_connect to open "
+                         "a connection for the background refresh")
+    if func is None:
+        return lambda f: cache_query_async(f, ttl=ttl, cache=cache, tables=tables,
+                                           stale_ttl=stale_ttl, negative_ttl=negative_ttl,
+                                           cache_errors=cache_errors,
+                                           refresh_connect=refresh_connect)
+    store = query_cache if cache is None else cache
+    policy = _CachePolicy(store, ttl, stale_ttl, negative_ttl, cache_errors, tables)
+    make_key = _key_builder(func)
+    flights = AsyncSingleFlight()
+    refreshing = {}  # key -> task; also keeps the tasks referenced until they finish
+
+    async def run(conn, args, kwargs, key, query, cache_failures=True):
+        generation = await _off_loop(store, lambda: store.generation)
+        try:
+            result = await func(conn, *args, **kwargs)
+        except policy.cache_errors as e:
+            if cache_failures:
+                await _off_loop(store, policy.store_error, key, query, e, generation)
+            raise
+        await _off_loop(store, policy.store_result, key, query, result, generation)
+        return result
+
+    async def refresh(args, kwargs, key, query, label):
+        try:
+            conn = refresh_connect()
+            if inspect.isawaitable(conn):  # e.g. aiosqlite.connect(path)
+                conn = await conn
+            try:
+                await flights.do(key, lambda: run(conn, args, kwargs, key, query,
+                                                  cache_failures=False))
+            finally:
+                closed = conn.close()
+                if inspect.isawaitable(closed):
+                    await closed
+        except Exception as e:
+            print(f"--- CACHE REFRESH FAILED --- Keeping stale result for query: {label} ({e})")
+        finally:
+            refreshing.pop(key, None)
+
+    @functools.wraps(func)
+    async def wrapper(conn, *args, **kwargs):
+        key, query = make_key((conn,) + args, kwargs)
+        label = _describe(func, key, query)
+
+        found = await _off_loop(store, store.lookup, key)
+        if found is not None:
+            result, stale = found
+            if stale:
+                print(f"--- CACHE STALE --- Returning stale result and refreshing query: {label}")
+                if key not in refreshing:
+                    refreshing[key] = asyncio.get_running_loop().create_task(
+                        refresh(args, kwargs, key, query, label))
+            else:
+                print(f"--- CACHE HIT --- Returning cached result for query: {label}")
+            return _unwrap(result)
+
+        async def load():
+            # A call that just finished may have filled the entry between
+            # the lookup above and this task becoming the leader.
+            found = await _off_loop(store, store.lookup, key, False)
+            if found is not None:
+                print(f"--- CACHE HIT --- Returning cached result for query: {label}")
+                return _unwrap(found[0])
+            print(f"--- CACHE MISS --- Executing query: {label}")
+            return await run(conn, args, kwargs, key, query)
+
+        result, ran = await flights.do(key, load)
+        if not ran:
+            print(f"--- CACHE WAIT --- Shared in-flight result for query: {label}")
         return result
+
+    wrapper.cache = store
     return wrapper
 
 # --- Database Setup (for demonstration purposes) ---
 # This part creates a dummy SQLite database and a 'users' table
 # to make the example runnable.
-try:
-    conn_setup = sqlite3.connect('users.db')
-    cursor_setup = conn_setup.cursor()
-    cursor_setup.execute('''
-        CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY,
-            name TEXT NOT NULL,
-            email TEXT UNIQUE NOT NULL
-        )
-    ''')
-    # Insert sample data, ignoring if already exists
-    cursor_setup.execute("INSERT OR IGNORE INTO users (id, name, email) VALUES (1, 'John Doe', 'john@example.com')")
-    cursor_setup.execute("INSERT OR IGNORE INTO users (id, name, email) VALUES (2, 'Jane Smith', 'jane@example.com')")
-    cursor_setup.execute("INSERT OR IGNORE INTO users (id, name, email) VALUES (3, 'Peter Jones', 'peter@example.com')")
-    conn_setup.commit()
-except sqlite3.Error as e:
-    print(f"Database setup error: {e}")
-finally:
-    if conn_setup:
-        conn_setup.close()
+def setup_database():
+    conn_setup = None
+    try:
+        conn_setup = sqlite3.connect('users.db')
+        cursor_setup = conn_setup.cursor()
+        cursor_setup.execute('''
+            CREATE TABLE IF NOT EXISTS users (
+                id INTEGER PRIMARY KEY,
+                name TEXT NOT NULL,
+                email TEXT UNIQUE NOT NULL
+            )
+        ''')
+        # Insert sample data, ignoring if already exists
+        cursor_setup.execute("INSERT OR IGNORE INTO users (id, name, email) VALUES (1, 'John Doe', 'john@example.com')")
+        cursor_setup.execute("INSERT OR IGNORE INTO users (id, name, email) VALUES (2, 'Jane Smith', 'jane@example.com')")
+        cursor_setup.execute("INSERT OR IGNORE INTO users (id, name, email) VALUES (3, 'Peter Jones', 'peter@example.com')")
+        conn_setup.commit()
+    except sqlite3.Error as e:
+        print(f"Database setup error: {e}")
+    finally:
+        if conn_setup:
+            conn_setup.close()
+
 
 # --- Decorated Functions ---
 
 @with_db_connection
+@cache_query(tables=['users'])
 def get_user_by_id(conn, user_id):
     """
     Fetches a user from the database by their ID using the provided connection.
@@ -180,100 +1103,195 @@ def fetch_users_with_retry(conn):
 
 @with_db_connection
 @cache_query
-def fetch_users_with_cache(conn, query):
+def fetch_users_with_cache(conn, query, params=()):
     """
     Fetches users from the database, with results being cached.
     """
     cursor = conn.cursor()
-    cursor.execute(query)
+    cursor.execute(query, params)
     return cursor.fetchall()
 
 
 # --- Demonstration of Usage ---
 
-print("--- Fetching user by ID with automatic connection handling ---")
-user = get_user_by_id(user_id=1)
-print(f"Fetched User by ID 1: {user}")
-
-print("\n--- Updating user's email (successful transaction) ---")
-try:
-    update_user_email(user_id=1, new_email='Crawford_Cartwright@hotmail.com')
-    print("Email update operation completed.")
-except Exception as e:
-    print(f"Email update operation failed: {e}")
-
-print("\n--- Verify updated email ---")
-user_updated = get_user_by_id(user_id=1)
-print(f"User ID 1 after update: {user_updated}")
-
-print("\n--- Attempting to update non-existent user's email (transactional rollback expected) ---")
-try:
-    update_user_email(user_id=999, new_email='nonexistent@example.com')
-    print("Email update operation completed (unexpectedly).")
-except Exception as e:
-    print(f"Email update operation failed as expected: {e}")
-
-print("\n--- Verify non-existent user was not created/affected ---")
-user_non_existent = get_user_by_id(user_id=999)
-print(f"User ID 999 after failed update attempt: {user_non_existent}")
-
-print("\n--- Demonstrating transactional rollback with simulated error ---")
-try:
-    create_user_and_fail(name="Ephemeral User", email="ephemeral@example.com", should_fail=True)
-    print("User creation operation completed (unexpectedly).")
-except Exception as e:
-    print(f"User creation operation failed as expected: {e}")
-
-print("\n--- Verify Ephemeral User was NOT created (due to rollback) ---")
-ephemeral_user = get_user_by_id(user_id=4) # Assuming ID 4 would be next if committed
-print(f"Ephemeral User after rollback: {ephemeral_user}") # Should be None if rolled back
-
-print("\n--- Demonstrating transactional commit without error ---")
-try:
-    create_user_and_fail(name="Persistent User", email="persistent@example.com", should_fail=False)
-    print("Persistent User creation operation completed successfully.")
-except Exception as e:
-    print(f"Persistent User creation operation failed: {e}")
-
-print("\n--- Verify Persistent User WAS created (due to commit) ---")
-persistent_user = get_user_by_id(user_id=4) # Assuming ID 4 would be next if committed
-print(f"Persistent User after commit: {persistent_user}") # Should show the user if committed
-
-print("\n--- Attempting to fetch users with automatic retry on failure ---")
-try:
-    users_with_retry = fetch_users_with_retry()
-    print("\nFetched Users with Retry (after successful retry):")
-    for user_r in users_with_retry:
-        print(user_r)
-except Exception as e:
-    print(f"Failed to fetch users after all retries: {e}")
-
-# Reset the error count for potential re-runs or further tests
-_simulate_fetch_error_count = 0
+if __name__ == "__main__":
+    setup_database()
+
+    print("--- Fetching user by ID with automatic connection handling ---")
+    user = get_user_by_id(user_id=1)
+    print(f"Fetched User by ID 1: {user}")
+
+    print("\n--- Updating user's email (successful transaction) ---")
+    try:
+        update_user_email(user_id=1, new_email='Crawford_Cartwright@hotmail.com')
+        print("Email update operation completed.")
+    except Exception as e:
+        print(f"Email update operation failed: {e}")
+
+    print("\n--- Verify updated email ---")
+    user_updated = get_user_by_id(user_id=1)
+    print(f"User ID 1 after update: {user_updated}")
+
+    print("\n--- Attempting to update non-existent user's email (transactional rollback expected) ---")
+    try:
+        update_user_email(user_id=999, new_email='nonexistent@example.com')
+        print("Email update operation completed (unexpectedly).")
+    except Exception as e:
+        print(f"Email update operation failed as expected: {e}")
+
+    print("\n--- Verify non-existent user was not created/affected ---")
+    user_non_existent = get_user_by_id(user_id=999)
+    print(f"User ID 999 after failed update attempt: {user_non_existent}")
+
+    print("\n--- Demonstrating transactional rollback with simulated error ---")
+    try:
+        create_user_and_fail(name="Ephemeral User", email="ephemeral@example.com", should_fail=True)
+        print("User creation operation completed (unexpectedly).")
+    except Exception as e:
+        print(f"User creation operation failed as expected: {e}")
+
+    print("\n--- Verify Ephemeral User was NOT created (due to rollback) ---")
+    ephemeral_user = get_user_by_id(user_id=4) # Assuming ID 4 would be next if committed
+    print(f"Ephemeral User after rollback: {ephemeral_user}") # Should be None if rolled back
+
+    print("\n--- Demonstrating transactional commit without error ---")
+    try:
+        create_user_and_fail(name="Persistent User", email="persistent@example.com", should_fail=False)
+        print("Persistent User creation operation completed successfully.")
+    except Exception as e:
+        print(f"Persistent User creation operation failed: {e}")
+
+    print("\n--- Verify Persistent User WAS created (due to commit) ---")
+    persistent_user = get_user_by_id(user_id=4) # Assuming ID 4 would be next if committed
+    print(f"Persistent User after commit: {persistent_user}") # Should show the user if committed
+
+    print("\n--- Attempting to fetch users with automatic retry on failure ---")
+    try:
+        users_with_retry = fetch_users_with_retry()
+        print("\nFetched Users with Retry (after successful retry):")
+        for user_r in users_with_retry:
+            print(user_r)
+    except Exception as e:
+        print(f"Failed to fetch users after all retries: {e}")
+
+    # Reset the error count for potential re-runs or further tests
+    _simulate_fetch_error_count = 0
+
+    print("\n--- Attempting fetch with retry, simulating enough failures to exhaust retries ---")
+    try:
+        # Set global counter to simulate failures for all 3 retries + initial attempt
+        _simulate_fetch_error_count = 0 # Reset for this test
+        # This call will fail 3 times and then the 4th attempt (initial + 3 retries) will also fail,
+        # causing the decorator to re-raise the last exception.
+        fetch_users_with_retry()
+    except Exception as e:
+        print(f"Successfully caught expected failure after all retries: {e}")
+
+    print("\n--- Demonstrating query caching ---")
+    print("First call to fetch_users_with_cache:")
+    # First call will execute the query and cache the result
+    users_cached_first = fetch_users_with_cache(query="SELECT * FROM users")
+    print("Result from first call:", users_cached_first)
+
+    print("\nSecond call to fetch_users_with_cache (should use cache):")
+    # Second call will use the cached result without executing the query
+    users_cached_second = fetch_users_with_cache(query="SELECT * FROM users")
+    print("Result from second call:", users_cached_second)
+
+    print("\nThird call with a different query (should not use cache for the new query):")
+    # Call with a different query, which should result in a cache miss
+    users_cached_different = fetch_users_with_cache(query="SELECT * FROM users WHERE id = 1")
+    print("Result from third call:", users_cached_different)
+
+    print("\nSame query with different parameters (separate cache entries):")
+    print("id = 1:", fetch_users_with_cache(query="SELECT * FROM users WHERE id = ?", params=(1,)))
+    print("id = 2:", fetch_users_with_cache(query="SELECT * FROM users WHERE id = ?", params=(2,)))
+    print("id = 1 again:", fetch_users_with_cache(query="SELECT  *  FROM users WHERE id = ?;", params=(1,)))
+    print("Cache stats:", query_cache.stats())
+
+    print("\n--- Write-aware invalidation ---")
+    print("Cached lookup:", get_user_by_id(user_id=2))
+    print("Cached lookup:", get_user_by_id(user_id=2))
+    update_user_email(user_id=2, new_email='jane.smith@example.com')
+    print("After committed update:", get_user_by_id(user_id=2))
+    print("Cache stats:", query_cache.stats())
+
+    print("\n--- Concurrent misses share one query ---")
+
+    @with_db_connection
+    @cache_query(ttl=60)
+    def fetch_users_slowly(conn, query):
+        """
+        Fetches users after a pause that stands in for an expensive query.
+        """
+        time.sleep(0.5)
+        cursor = conn.cursor()
+        cursor.execute(query)
+        return cursor.fetchall()
+
+    threads = [threading.Thread(target=fetch_users_slowly, kwargs={'query': "SELECT name FROM users"})
+               for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    @cache_query_async(ttl=60)
+    async def count_users_async(conn, query):
+        """
+        Counts users after an asynchronous pause that stands in for a slow query.
+        """
+        await asyncio.sleep(0.5)
+        return conn.execute(query).fetchone()[0]
+
+    async def count_users_concurrently():
+        conn = sqlite3.connect('users.db')
+        try:
+            counts = await asyncio.gather(*(count_users_async(conn, query="SELECT COUNT(*) FROM users")
+                                            for _ in range(5)))
+            print("Counts:", counts)
+        finally:
+            conn.close()
+
+    asyncio.run(count_users_concurrently())
+
+    print("\n--- Two-tier cache with a shared on-disk L2 ---")
+    shared_cache = QueryCache(l2=DiskCache('query_cache.db'))
+
+    @with_db_connection
+    @cache_query(ttl=60, cache=shared_cache)
+    def fetch_users_shared(conn, query):
+        """
+        Fetches users through a cache whose entries are shared with other processes.
+        """
+        cursor = conn.cursor()
+        cursor.execute(query)
+        return cursor.fetchall()
+
+    shared_cache.l2.clear()
+    fetch_users_shared(query="SELECT id, email FROM users")
+    shared_cache.clear()  # as if this were a fresh worker process: L1 empty, L2 warm
+    fetch_users_shared(query="SELECT id, email FROM users")
+    print("Shared cache stats:", shared_cache.stats())
+
+    print("\n--- Stale-while-revalidate and negative caching ---")
+
+    @with_db_connection
+    @cache_query(ttl=1, stale_ttl=30, refresh_connect=lambda: sqlite3.connect('users.db'))
+    def count_users(conn, query):
+        """
+        Counts users; after a second the count is served stale while it refreshes.
+        """
+        cursor = conn.cursor()
+        cursor.execute(query)
+        return cursor.fetchone()[0]
 
-print("\n--- Attempting fetch with retry, simulating enough failures to exhaust retries ---")
-try:
-    # Set global counter to simulate failures for all 3 retries + initial attempt
-    _simulate_fetch_error_count = 0 # Reset for this test
-    # This call will fail 3 times and then the 4th attempt (initial + 3 retries) will also fail,
-    # causing the decorator to re-raise the last exception.
-    fetch_users_with_retry()
-except Exception as e:
-    print(f"Successfully caught expected failure after all retries: {e}")
-
-print("\n--- Demonstrating query caching ---")
-print("First call to fetch_users_with_cache:")
-# First call will execute the query and cache the result
-users_cached_first = fetch_users_with_cache(query="SELECT * FROM users")
-print("Result from first call:", users_cached_first)
-
-print("\nSecond call to fetch_users_with_cache (should use cache):")
-# Second call will use the cached result without executing the query
-users_cached_second = fetch_users_with_cache(query="SELECT * FROM users")
-print("Result from second call:", users_cached_second)
-
-print("\nThird call with a different query (should not use cache for the new query):")
-# Call with a different query, which should result in a cache miss
-users_cached_different = fetch_users_with_cache(query="SELECT * FROM users WHERE id = 1")
-print("Result from third call:", users_cached_different)
+    print("Users:", count_users(query="SELECT COUNT(*) FROM users"))
+    time.sleep(1.1)
+    print("Users:", count_users(query="SELECT COUNT(*) FROM users"))  # stale, refresh started
+    time.sleep(0.2)
+    print("Users:", count_users(query="SELECT COUNT(*) FROM users"))  # refreshed
 
+    print("Missing user:", get_user_by_id(user_id=404))
+    print("Missing user:", get_user_by_id(user_id=404))  # None is cached for negative_ttl
+    print("Cache stats:", query_cache.stats())
@@ -0,0 +1,527 @@
+import asyncio
+import importlib
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import unittest
+
+try:
+    import aiosqlite
+except ImportError:  # only needed for the async refresh test
+    aiosqlite = None
+
+cache_query = importlib.import_module('4-cache_query')
+DiskCache = cache_query.DiskCache
+QueryCache = cache_query.QueryCache
+
+
+class TestCacheKeys(unittest.TestCase):
+    """Keys ignore SQL layout but not parameters, functions or modules."""
+
+    def test_normalize_sql(self):
+        self.assertEqual(cache_query.normalize_sql("  SELECT *\n  FROM users\tWHERE id = ? ; "),
+                         "SELECT * FROM users WHERE id = ?")
+        self.assertEqual(cache_query.normalize_sql("SELECT 'a  b' FROM users"),
+                         "SELECT 'a  b' FROM users")
+        self.assertEqual(cache_query.normalize_sql(None), None)
+
+    def test_parameters_are_part_of_the_key(self):
+        calls = []
+
+        @cache_query.cache_query(cache=QueryCache())
+        def fetch(conn, query, params=()):
+            calls.append(params)
+            return [params]
+
+        self.assertEqual(fetch(None, query="SELECT * FROM users WHERE id = ?", params=(1,)), [(1,)])
+        self.assertEqual(fetch(None, query="SELECT * FROM users WHERE id = ?", params=(2,)), [(2,)])
+        self.assertEqual(fetch(None, query="SELECT  *  FROM users WHERE id = ?;", params=(1,)),
+                         [(1,)])
+        self.assertEqual(fetch(None, query="SELECT * FROM users WHERE id = ?", params=[1]), [(1,)])
+        self.assertEqual(calls, [(1,), (2,)])
+
+    def test_key_names_module_and_function(self):
+        def fetch(conn, user_id):
+            return user_id
+
+        key, query = cache_query._key_builder(fetch)((None, 1), {})
+        self.assertEqual(key, (__name__, fetch.__qualname__, ('user_id', 1)))
+        self.assertIsNone(query)
+        fetch.__module__ = 'elsewhere'
+        other, _ = cache_query._key_builder(fetch)((None, 1), {})
+        self.assertNotEqual(DiskCache._key(key), DiskCache._key(other))
+
+
+class TestQueryCacheLimits(unittest.TestCase):
+    """LRU eviction by entry count and by size, and per-entry TTL."""
+
+    def test_evicts_least_recently_used_by_count(self):
+        cache = QueryCache(max_entries=2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')  # 'b' is now the least recently used
+        cache.set('c', 3)
+        self.assertEqual((cache.get('a'), cache.get('b'), cache.get('c')), (1, None, 3))
+        self.assertEqual(len(cache), 2)
+
+    def test_evicts_by_bytes(self):
+        row = 'x' * 1000
+        size = cache_query._approx_size([row])
+        cache = QueryCache(max_bytes=size * 2)
+        for key in 'abc':
+            cache.set(key, [row])
+        self.assertNotIn('a', cache)
+        self.assertIn('c', cache)
+        self.assertLessEqual(cache.total_bytes, size * 2)
+
+    def test_oversized_result_is_not_cached(self):
+        cache = QueryCache(max_bytes=100)
+        self.assertFalse(cache.set('big', ['x' * 1000]))
+        self.assertEqual(len(cache), 0)
+
+    def test_entries_expire_after_ttl(self):
+        cache = QueryCache()
+        cache.set('short', 1, ttl=0.05)
+        cache.set('forever', 2, ttl=None)
+        self.assertEqual(cache.get('short'), 1)
+        time.sleep(0.1)
+        self.assertIsNone(cache.get('short'))
+        self.assertEqual(cache.get('forever'), 2)
+        self.assertEqual(cache.total_bytes, cache_query._approx_size(2))
+
+
+class TestTableParsing(unittest.TestCase):
+    """The tables a query reads and a statement writes."""
+
+    def test_tables_read(self):
+        self.assertEqual(cache_query.tables_read("SELECT * FROM users"), {'users'})
+        self.assertEqual(cache_query.tables_read(
+            "SELECT u.name FROM main.Users u JOIN `orders` o ON o.user_id = u.id "
+            "WHERE o.total > (SELECT AVG(total) FROM payments)"),
+            {'users', 'orders', 'payments'})
+        self.assertEqual(cache_query.tables_read("SELECT * FROM a, b WHERE a.id = b.id"), {'a', 'b'})
+
+    def test_tables_written(self):
+        for statement, table in [("INSERT INTO users (name) VALUES (?)", 'users'),
+                                 ("INSERT OR REPLACE INTO Users VALUES (1)", 'users'),
+                                 ("UPDATE users SET email = ?", 'users'),
+                                 ("DELETE FROM main.orders WHERE id = 1", 'orders'),
+                                 ("DROP TABLE IF EXISTS archive", 'archive')]:
+            self.assertEqual(cache_query.tables_written(statement), {table})
+        self.assertEqual(cache_query.tables_written("SELECT * FROM users"), set())
+
+
+class TestQueryCacheGeneration(unittest.TestCase):
+    """Invalidation drops dependent entries and refuses results computed before it."""
+
+    def test_invalidation_bumps_generation(self):
+        cache = QueryCache()
+        generation = cache.generation
+        cache.invalidate_tables(['users'])
+        self.assertGreater(cache.generation, generation)
+
+    def test_set_with_old_generation_is_refused(self):
+        cache = QueryCache()
+        generation = cache.generation
+        cache.invalidate_tables(['orders'])
+        self.assertFalse(cache.set('k', 'stale', tables=['users'], generation=generation))
+        self.assertIsNone(cache.lookup('k'))
+        self.assertTrue(cache.set('k', 'fresh', tables=['users'], generation=cache.generation))
+        self.assertEqual(cache.lookup('k'), ('fresh', False))
+
+    def test_invalidation_only_drops_dependent_entries(self):
+        cache = QueryCache()
+        cache.set('users', 1, tables=['users'])
+        cache.set('orders', 2, tables=['orders'])
+        cache.set('anything', 3)
+        cache.invalidate_tables(['USERS'])
+        self.assertIsNone(cache.get('users'))
+        self.assertIsNone(cache.get('anything'))
+        self.assertEqual(cache.get('orders'), 2)
+
+
+class TestTransactionalInvalidation(unittest.TestCase):
+    """@transactional drops cached reads of the tables it wrote."""
+
+    def setUp(self):
+        self.conn = sqlite3.connect(':memory:', factory=cache_query.TracedConnection)
+        self.conn.executescript("""
+            CREATE TABLE users (id INTEGER PRIMARY KEY, email TEXT);
+            CREATE TABLE orders (id INTEGER PRIMARY KEY);
+            INSERT INTO users VALUES (1, 'a@x');
+        """)
+        self.cache = QueryCache()
+
+        @cache_query.cache_query(cache=self.cache)
+        def read(conn, query):
+            return conn.execute(query).fetchall()
+        self.read = read
+
+    def tearDown(self):
+        self.conn.close()
+
+    def run_transaction(self, body):
+        return cache_query.transactional(body)(self.conn)
+
+    def test_commit_invalidates_written_tables(self):
+        self.read(self.conn, query="SELECT email FROM users")
+        self.read(self.conn, query="SELECT id FROM orders")
+        self.run_transaction(lambda conn: conn.execute("UPDATE users SET email = 'b@x'"))
+        self.assertEqual(self.read(self.conn, query="SELECT email FROM users"), [('b@x',)])
+        self.assertIn(self.cache_key("SELECT id FROM orders"), self.cache)
+
+    def test_read_only_transaction_invalidates_nothing(self):
+        self.read(self.conn, query="SELECT email FROM users")
+        self.run_transaction(lambda conn: conn.execute("SELECT * FROM users").fetchall())
+        self.assertEqual(self.cache.invalidations, 0)
+
+    def test_unrecognised_write_invalidates_everything(self):
+        self.read(self.conn, query="SELECT email FROM users")
+        self.run_transaction(lambda conn: conn.execute(
+            "WITH t AS (SELECT 1) UPDATE users SET email = 'new' WHERE id IN (SELECT * FROM t)"))
+        self.assertEqual(self.read(self.conn, query="SELECT email FROM users"), [('new',)])
+
+    def test_rollback_drops_reads_of_uncommitted_writes(self):
+        def body(conn):
+            conn.execute("UPDATE users SET email = 'phantom'")
+            self.read(conn, query="SELECT email FROM users")
+            raise ValueError("abort")
+
+        with self.assertRaises(ValueError):
+            self.run_transaction(body)
+        self.assertEqual(self.read(self.conn, query="SELECT email FROM users"), [('a@x',)])
+
+    def test_callers_trace_callback_is_kept(self):
+        seen = []
+        self.conn.set_trace_callback(seen.append)
+        self.run_transaction(lambda conn: conn.execute("DELETE FROM orders"))
+        self.assertIn("DELETE FROM orders", seen)
+        self.assertEqual(self.conn.trace_callback, seen.append)
+
+    def cache_key(self, query):
+        return cache_query._key_builder(self.read.__wrapped__)((None,), {'query': query})[0]
+
+
+class TestSingleFlight(unittest.TestCase):
+    """Concurrent calls for one key share a single run of fn."""
+
+    def test_concurrent_calls_run_once(self):
+        flights = cache_query.SingleFlight()
+        started, release = threading.Event(), threading.Event()
+        calls, results = [], []
+
+        def fn():
+            calls.append(1)
+            started.set()
+            release.wait(5)
+            return 'rows'
+
+        leader = threading.Thread(target=lambda: results.append(flights.do('k', fn)))
+        leader.start()
+        started.wait(5)
+        waiters = [threading.Thread(target=lambda: results.append(flights.do('k', fn)))
+                   for _ in range(4)]
+        for thread in waiters:
+            thread.start()
+        time.sleep(0.05)
+        release.set()
+        for thread in [leader] + waiters:
+            thread.join(5)
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(sorted(results), [('rows', False)] * 4 + [('rows', True)])
+
+    def test_waiters_receive_the_error(self):
+        flights = cache_query.SingleFlight()
+        started, release = threading.Event(), threading.Event()
+        errors = []
+
+        def fn():
+            started.set()
+            release.wait(5)
+            raise LookupError('gone')
+
+        def call():
+            try:
+                flights.do('k', fn)
+            except LookupError as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=call)]
+        threads[0].start()
+        started.wait(5)
+        threads.append(threading.Thread(target=call))
+        threads[1].start()
+        time.sleep(0.05)
+        release.set()
+        for thread in threads:
+            thread.join(5)
+        self.assertEqual(len(errors), 2)
+        self.assertIsNot(errors[0], errors[1])
+        self.assertEqual(errors[1].args, ('gone',))
+
+    def test_sequential_calls_each_run(self):
+        flights = cache_query.SingleFlight()
+        self.assertEqual(flights.do('k', lambda: 1), (1, True))
+        self.assertEqual(flights.do('k', lambda: 2), (2, True))
+
+
+class TestAsyncSingleFlight(unittest.TestCase):
+    """The same for coroutines, including a cancelled leader."""
+
+    def test_concurrent_awaits_run_once(self):
+        flights = cache_query.AsyncSingleFlight()
+        calls = []
+
+        async def fn():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return 'rows'
+
+        async def main():
+            return await asyncio.gather(*(flights.do('k', fn) for _ in range(5)))
+
+        results = asyncio.run(main())
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(sorted(results), [('rows', False)] * 4 + [('rows', True)])
+
+    def test_waiter_takes_over_from_cancelled_leader(self):
+        flights = cache_query.AsyncSingleFlight()
+        calls = []
+
+        async def fn():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return len(calls)
+
+        async def main():
+            leader = asyncio.ensure_future(flights.do('k', fn))
+            await asyncio.sleep(0)
+            waiter = asyncio.ensure_future(flights.do('k', fn))
+            await asyncio.sleep(0.01)
+            leader.cancel()
+            return await waiter
+
+        self.assertEqual(asyncio.run(main()), (2, True))
+
+class TestCoalescedMisses(unittest.TestCase):
+    """A miss that becomes the leader looks the key up once more before running."""
+
+    class MissFirst(QueryCache):
+        """Reports a miss to the first lookup of each call, as if filled just after."""
+
+        def lookup(self, key, count=True):
+            return None if count else super().lookup(key, count)
+
+    def test_sync_load_rechecks(self):
+        cache, calls = self.MissFirst(), []
+
+        @cache_query.cache_query(cache=cache)
+        def fetch(conn, query):
+            calls.append(query)
+            return 7
+
+        self.assertEqual([fetch(None, query="SELECT 1") for _ in range(3)], [7, 7, 7])
+        self.assertEqual(len(calls), 1)
+
+    def test_async_load_rechecks(self):
+        cache, calls = self.MissFirst(), []
+
+        @cache_query.cache_query_async(cache=cache)
+        async def fetch(conn, query):
+            calls.append(query)
+            return 8
+
+        async def main():
+            return [await fetch(None, query="SELECT 2") for _ in range(3)]
+
+        self.assertEqual(asyncio.run(main()), [8, 8, 8])
+        self.assertEqual(len(calls), 1)
+
+    def test_second_look_is_not_counted(self):
+        cache = QueryCache()
+        cache.set('k', 1)
+        cache.lookup('k', count=False)
+        cache.lookup('missing', count=False)
+        stats = cache.stats()
+        self.assertEqual((stats['hits'], stats['misses']), (0, 0))
+
+
+class TestQueryCacheL2(unittest.TestCase):
+    """Two caches sharing one DiskCache file, as two processes would."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, 'query_cache.db')
+        self.first = QueryCache(l2=DiskCache(self.path), sync_interval=0)
+        self.second = QueryCache(l2=DiskCache(self.path), sync_interval=0)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_l1_miss_is_promoted_from_l2(self):
+        self.first.set('k', [(1, 'John')], ttl=60, tables=['users'])
+        self.assertEqual(self.second.lookup('k'), ([(1, 'John')], False))
+        self.assertEqual(self.second.stats()['l2_hits'], 1)
+        self.assertIn('k', self.second)
+
+    def test_invalidation_reaches_the_other_cache(self):
+        self.first.set('k', 'v', tables=['users'])
+        self.assertEqual(self.second.get('k'), 'v')
+        generation = self.second.generation
+        self.first.invalidate_tables(['users'])
+        self.assertIsNone(self.second.lookup('k'))
+        self.assertGreater(self.second.generation, generation)
+        self.assertFalse(self.second.set('k', 'old', tables=['users'], generation=generation))
+        self.assertIsNone(self.first.l2.get('k'))
+
+    def test_clear_all_reaches_the_other_cache(self):
+        self.second.set('k', 'v', tables=['orders'])
+        self.first.l2.clear()
+        self.assertIsNone(self.second.lookup('k'))
+
+    def test_invalidation_during_l2_write_drops_both_tiers(self):
+        cache = QueryCache(l2=DiskCache(self.path))
+        write = cache.l2.set
+
+        def set_then_invalidate(*args, **kwargs):
+            write(*args, **kwargs)
+            cache.invalidate_tables(['users'], propagate=False)
+
+        cache.l2.set = set_then_invalidate
+        self.assertFalse(cache.set('k', 'v', tables=['users']))
+        self.assertIsNone(cache.l2.get('k'))
+        self.assertNotIn('k', cache)
+
+    def test_slow_l2_read_does_not_block_l1_hits(self):
+        cache = QueryCache(l2=DiskCache(self.path))
+        cache.set('hot', 1)
+        read = cache.l2.get
+        reading = threading.Event()
+
+        def slow_get(key):
+            reading.set()
+            time.sleep(0.3)
+            return read(key)
+
+        cache.l2.get = slow_get
+        cold = threading.Thread(target=cache.lookup, args=('cold',))
+        cold.start()
+        reading.wait(5)
+        started = time.monotonic()
+        self.assertEqual(cache.lookup('hot'), (1, False))
+        self.assertLess(time.monotonic() - started, 0.1)
+        cold.join(5)
+
+
+class TestCachedErrors(unittest.TestCase):
+    """Cached exceptions are raised as fresh copies."""
+
+    def test_each_hit_raises_a_new_exception(self):
+        cache = QueryCache()
+
+        @cache_query.cache_query(cache=cache, cache_errors=(KeyError,))
+        def lookup(conn, query):
+            raise KeyError('missing')
+
+        errors = []
+        for _ in range(3):
+            with self.assertRaises(KeyError) as raised:
+                lookup(None, query="SELECT 1")
+            errors.append(raised.exception)
+        self.assertIsNot(errors[1], errors[2])
+        self.assertEqual(errors[1].args, ('missing',))
+
+    def test_stale_ttl_requires_refresh_connect(self):
+        with self.assertRaises(ValueError):
+            cache_query.cache_query(stale_ttl=30)
+        with self.assertRaises(ValueError):
+            cache_query.cache_query_async(stale_ttl=30)
+
+
+class TestStaleAndNegative(unittest.TestCase):
+    """Stale results are served while refreshed; empty results expire quickly."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, 'users.db')
+        with sqlite3.connect(self.path) as conn:
+            conn.execute("CREATE TABLE users (id INTEGER PRIMARY KEY, email TEXT)")
+            conn.execute("INSERT INTO users VALUES (1, 'a@x')")
+        conn.close()
+        self.cache = QueryCache()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def update(self, email):
+        conn = sqlite3.connect(self.path)
+        with conn:
+            conn.execute("UPDATE users SET email = ?", (email,))
+        conn.close()
+
+    def wait_for(self, condition):
+        deadline = time.monotonic() + 5
+        while not condition() and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    def test_stale_result_is_refreshed_in_background(self):
+        @cache_query.cache_query(cache=self.cache, ttl=0.05, stale_ttl=30,
+                                 refresh_connect=lambda: sqlite3.connect(self.path))
+        def email(conn, query):
+            return conn.execute(query).fetchone()[0]
+
+        conn = sqlite3.connect(self.path)
+        self.addCleanup(conn.close)
+        query = "SELECT email FROM users"
+        self.assertEqual(email(conn, query=query), 'a@x')
+        self.update('b@x')
+        time.sleep(0.1)
+        self.assertEqual(email(conn, query=query), 'a@x')  # stale, refresh started
+        self.wait_for(lambda: email(conn, query=query) == 'b@x')
+        self.assertEqual(email(conn, query=query), 'b@x')
+        self.assertGreaterEqual(self.cache.stats()['stale_hits'], 1)
+
+    @unittest.skipIf(aiosqlite is None, "aiosqlite is not installed")
+    def test_async_refresh_with_aiosqlite(self):
+        @cache_query.cache_query_async(cache=self.cache, ttl=0.05, stale_ttl=30,
+                                       refresh_connect=lambda: aiosqlite.connect(self.path))
+        async def email(conn, query):
+            async with conn.execute(query) as cursor:
+                return (await cursor.fetchone())[0]
+
+        async def main():
+            query = "SELECT email FROM users"
+            async with aiosqlite.connect(self.path) as conn:
+                first = await email(conn, query=query)
+                self.update('b@x')
+                await asyncio.sleep(0.1)
+                stale = await email(conn, query=query)
+                for _ in range(500):
+                    await asyncio.sleep(0.01)
+                    if await email(conn, query=query) == 'b@x':
+                        break
+                return first, stale, await email(conn, query=query)
+
+        self.assertEqual(asyncio.run(main()), ('a@x', 'a@x', 'b@x'))
+
+    def test_none_is_cached_for_negative_ttl(self):
+        calls = []
+
+        @cache_query.cache_query(cache=self.cache, negative_ttl=0.05)
+        def find(conn, user_id):
+            calls.append(user_id)
+            return None
+
+        self.assertIsNone(find(None, user_id=404))
+        self.assertIsNone(find(None, user_id=404))
+        self.assertEqual(len(calls), 1)
+        time.sleep(0.1)
+        self.assertIsNone(find(None, user_id=404))
+        self.assertEqual(len(calls), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,26 +1,64 @@
-import mysql.connector
 from mysql.connector import Error
 
-def stream_users():
-    """Generator that yields rows one by one from user_data table."""
+import db_pool
+from managed import managed_stream
+from rows import USER_COLUMNS, apply_row_factory, row_bytes
+
+# Rows measured per chunk to estimate the row width.
+_SAMPLE_ROWS = 16
+
+
+@managed_stream
+def stream_users(stream=False, chunk_size=1000, max_chunk_bytes=8 * 1024 * 1024,
+                 row_factory=None, raise_errors=False):
+    """
+    Generator that yields rows one by one from user_data table.
+
+    With stream=True the query runs on an unbuffered cursor, so MySQL sends
+    rows as they are read instead of the client materializing the full
+    result first. Rows are pulled with fetchmany() and at most one chunk is
+    held in memory. Each fetch asks for max_chunk_bytes / average row width
+    rows (at most chunk_size), the width being measured on a sample of the
+    previous chunk; the first fetch is a small probe, so no chunk is built
+    before the width is known.
+
+    row_factory (e.g. rows.UserRow) is called with (user_id, name, email,
+    age) for each row instead of building a dictionary.
+
+    Database errors are printed and end the stream, unless raise_errors=True,
+    in which case they propagate to the caller (who can then tell a
+    complete result from a truncated one).
+
+    Use it as a context manager (with stream_users() as rows: ...) to return
+    the connection to the pool as soon as the block exits.
+    """
+    dictionary = row_factory is None
+    query = f"SELECT {'*' if dictionary else USER_COLUMNS} FROM user_data;"
     try:
-        connection = mysql.connector.connect(
-            host='localhost',
-            user='root',
-            password='Legionnaire@27',
-            database='ALX_prodev'
-        )
+        if not stream:
+            with db_pool.cursor(dictionary=dictionary) as cursor:
+                cursor.execute(query)
 
-        if connection.is_connected():
-            cursor = connection.cursor(dictionary=True)
-            cursor.execute("SELECT * FROM user_data;")
+                for row in cursor:
+                    yield row if dictionary else row_factory(*row)  # 🔁 Yield one row at a time
+            return
 
-            for row in cursor:
-                yield row  # 🔁 Yield one row at a time
+        with db_pool.cursor(dictionary=dictionary, buffered=False) as cursor:
+            cursor.execute(query)
 
-            cursor.close()
-            connection.close()
+            size = min(chunk_size, _SAMPLE_ROWS)
+            while True:
+                rows = cursor.fetchmany(size)
+                if not rows:
+                    break
+                if not dictionary:
+                    rows = apply_row_factory(rows, row_factory)
+                sample = rows[:_SAMPLE_ROWS]
+                width = sum(map(row_bytes, sample)) / len(sample)
+                size = max(1, min(chunk_size, int(max_chunk_bytes / width)))
+                yield from rows
 
     except Error as e:
+        if raise_errors:
+            raise
         print(f"❌ Error while streaming users: {e}")
-
@@ -1,25 +1,60 @@
-import mysql.connector
+import time
+
 from mysql.connector import Error
 
-def stream_users_in_batches(batch_size):
+import db_pool
+from columnar import ColumnBatch
+from managed import managed_stream
+from predicates import Predicate, split
+from rows import USER_COLUMNS, apply_row_factory
+
+@managed_stream
+def stream_users_in_batches(batch_size, where=None, columnar=False, row_factory=None,
+                            sizer=None):
     """
     Generator that yields batches of users from the user_data table.
-    Each yield returns a list of up to 'batch_size' user dictionaries.
+    Each yield returns a list of up to 'batch_size' user dictionaries, or a
+    ColumnBatch (see columnar.py) when columnar=True.
+
+    'where' is an optional predicate (see predicates.py). Everything SQL can
+    express is compiled into a parameterized WHERE clause; only the remaining
+    Python-only conditions are checked client-side.
+
+    row_factory (e.g. rows.UserRow) builds each row from (user_id, name,
+    email, age) instead of a dictionary.
+
+    Pass a batch_sizing.BatchSizer as 'sizer' to let the batch size adapt
+    at runtime toward its target fetch time and byte budget; batch_size is
+    then ignored. sizer.history keeps the latest sizes chosen and
+    sizer.metrics() summarises all of them.
+
+    The returned stream is a context manager; leaving the 'with' block
+    closes the cursor and returns the connection to the pool immediately.
     """
-    try:
-        connection = mysql.connector.connect(
-            host='localhost',
-            user='root',
-            password='Legionnaire@27' 
-            database='ALX_prodev'
-        )
+    where_sql, params, residual = split(where)
+    dictionary = row_factory is None
+    query = f"SELECT {'*' if dictionary else USER_COLUMNS} FROM user_data"
+    if where_sql:
+        query += f" WHERE {where_sql}"
+
+    if columnar:
+        yield from _stream_column_batches(batch_size, query, params, residual, sizer)
+        return
 
-        if connection.is_connected():
-            cursor = connection.cursor(dictionary=True)
-            cursor.execute("SELECT * FROM user_data;")
+    if sizer is not None:
+        yield from _stream_adaptive_batches(query, params, residual, row_factory, sizer)
+        return
+
+    try:
+        with db_pool.cursor(dictionary=dictionary) as cursor:
+            cursor.execute(query + ";", params)
 
             batch = []
             for row in cursor:
+                if not dictionary:
+                    row = row_factory(*row)
+                if residual is not None and not residual.matches(row):
+                    continue
                 batch.append(row)
                 if len(batch) == batch_size:
                     yield batch
@@ -27,19 +62,84 @@ def stream_users_in_batches(batch_size):
             if batch:
                 yield batch
 
-            cursor.close()
-            connection.close()
+    except Error as e:
+        print(f"❌ Error: {e}")
+
+
+def _fetch_timed(cursor, size, sizer):
+    """fetchmany(size), reporting the batch and its fetch time to the sizer if any."""
+    started = time.perf_counter()
+    rows = cursor.fetchmany(size)
+    if sizer is not None:
+        sizer.record(rows, time.perf_counter() - started)
+    return rows
+
+
+def _stream_adaptive_batches(query, params, residual, row_factory, sizer):
+    """Fetch batches whose size is chosen by 'sizer' before every fetch."""
+    dictionary = row_factory is None
+    try:
+        with db_pool.cursor(dictionary=dictionary, buffered=False) as cursor:
+            cursor.execute(query + ";", params)
+
+            while True:
+                batch = _fetch_timed(cursor, sizer.size, sizer)
+                if not batch:
+                    break
+                if not dictionary:
+                    batch = apply_row_factory(batch, row_factory)
+                if residual is not None:
+                    batch = [row for row in batch if residual.matches(row)]
+                if batch:
+                    yield batch
+
+    except Error as e:
+        print(f"❌ Error: {e}")
+
+
+def _stream_column_batches(batch_size, query, params, residual, sizer=None):
+    """
+    Fetch tuple rows in chunks of batch_size (or sizes chosen by 'sizer') and
+    pivot each chunk into a ColumnBatch, so no per-row dictionary is ever built.
+    """
+    try:
+        with db_pool.cursor(buffered=False) as cursor:
+            cursor.execute(query + ";", params)
+            names = cursor.column_names
+
+            while True:
+                size = batch_size if sizer is None else sizer.size
+                rows = _fetch_timed(cursor, size, sizer)
+                if not rows:
+                    break
+                batch = ColumnBatch.from_rows(names, rows)
+                if residual is not None:
+                    batch = batch.select([residual.matches(r) for r in batch.rows()])
+                if len(batch):
+                    yield batch
 
     except Error as e:
         print(f"❌ Error: {e}")
 
 
-def batch_processing(batch_size):
+@managed_stream
+def batch_processing(batch_size, where=Predicate('age', '>', 25)):
     """
     Generator that yields users over age 25 from each batch.
+    The age filter runs in the database, so only matching rows are fetched.
     """
-    for batch in stream_users_in_batches(batch_size):
-        for user in batch:
-            if user['age'] > 25:
+    with stream_users_in_batches(batch_size, where=where) as batches:
+        for batch in batches:
+            for user in batch:
                 yield user
 
+
+@managed_stream
+def columnar_batch_processing(batch_size, min_age=25):
+    """
+    Columnar counterpart of batch_processing: streams ColumnBatches and
+    applies the age filter to each whole batch at once.
+    """
+    with stream_users_in_batches(batch_size, columnar=True) as batches:
+        for batch in batches:
+            yield batch.select(batch.mask('age', '>', min_age))
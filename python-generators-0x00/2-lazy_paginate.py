@@ -1,26 +1,87 @@
-import mysql.connector
+import base64
+import json
 from mysql.connector import Error
 
-def paginate_users(page_size, offset):
+import db_pool
+from managed import managed_stream
+from pipeline import read_ahead
+from rows import USER_COLUMNS, apply_row_factory
+
+# Columns that may be used as the keyset sort key: only indexed ones (the
+# primary key and the unique email index, which InnoDB extends with the
+# primary key), so each page stays an index range read. The key is
+# interpolated into the SQL text, so it must come from this list and never
+# from user input.
+KEYSET_COLUMNS = ('user_id', 'email')
+
+
+def encode_resume_token(last_row, sort_key='user_id'):
+    """
+    Build an opaque resume token from the last row a consumer has processed.
+    Pass it back to lazy_paginate(resume_token=...) to continue after that row.
+    """
+    state = {'k': sort_key, 'id': str(last_row['user_id'])}
+    if sort_key != 'user_id':
+        state['v'] = last_row[sort_key]
+    raw = json.dumps(state, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii')
+
+
+def decode_resume_token(token):
+    """
+    Decode a resume token into (sort_key, position) where position is the
+    tuple of values to seek past.
+    """
+    try:
+        state = json.loads(base64.urlsafe_b64decode(token.encode('ascii')))
+        sort_key = state['k']
+        position = (state['id'],) if sort_key == 'user_id' else (state['v'], state['id'])
+    except (ValueError, KeyError, TypeError, AttributeError) as e:
+        raise ValueError(f"Invalid resume token: {e!r}")
+    if sort_key not in KEYSET_COLUMNS:
+        raise ValueError(f"Invalid resume token: unknown sort key {sort_key!r}")
+    return sort_key, position
+
+
+def paginate_users(page_size, offset=0, after=None, sort_key=None, row_factory=None):
     """
     Fetch a specific page of users from the database.
+
+    Without a sort_key the page is addressed by LIMIT/OFFSET. With a sort_key
+    the page is fetched by keyset instead: rows are ordered by
+    (sort_key, user_id) and, when 'after' is a position tuple (see
+    decode_resume_token), the query seeks past it, so each page is an index
+    range read regardless of how deep into the table it is.
+
+    row_factory (e.g. rows.UserRow) builds each row from (user_id, name,
+    email, age) instead of a dictionary.
     """
+    if sort_key is not None and sort_key not in KEYSET_COLUMNS:
+        raise ValueError(f"Unsupported sort key: {sort_key!r}")
+
     try:
-        connection = mysql.connector.connect(
-            host='localhost',
-            user='root',
-            password='Legionnaire@27',
-            database='ALX_prodev'
-        )
-
-        if connection.is_connected():
-            cursor = connection.cursor(dictionary=True)
-            query = "SELECT * FROM user_data LIMIT %s OFFSET %s;"
-            cursor.execute(query, (page_size, offset))
+        dictionary = row_factory is None
+        columns = '*' if dictionary else USER_COLUMNS
+        with db_pool.cursor(dictionary=dictionary) as cursor:
+            if sort_key is None:
+                query = f"SELECT {columns} FROM user_data LIMIT %s OFFSET %s;"
+                params = (page_size, offset)
+            else:
+                order = "user_id" if sort_key == 'user_id' else f"{sort_key}, user_id"
+                if after is None:
+                    where = ""
+                    params = (page_size,)
+                elif sort_key == 'user_id':
+                    where = "WHERE user_id > %s "
+                    params = (db_pool.user_id_param(after[0]), page_size)
+                else:
+                    where = f"WHERE ({sort_key}, user_id) > (%s, %s) "
+                    params = (after[0], db_pool.user_id_param(after[1]), page_size)
+                query = f"SELECT {columns} FROM user_data {where}ORDER BY {order} LIMIT %s;"
+            cursor.execute(query, params)
             users = cursor.fetchall()
-
-            cursor.close()
-            connection.close()
+            if not dictionary:
+                users = apply_row_factory(users, row_factory)
 
             return users
 
@@ -28,23 +89,67 @@ def paginate_users(page_size, offset):
         print(f"❌ Error: {e}")
         return []
 
-def lazy_paginate(page_size):
-    """
-    Generator that lazily loads paginated data using one loop.
-    """
-    offset = 0
+
+def _pages(page_size, keyset, sort_key, after, row_factory):
+    """Yield successive pages until the table is exhausted."""
+    if not keyset:
+        offset = 0
+        while True:
+            users = paginate_users(page_size, offset, row_factory=row_factory)
+            if not users:
+                break
+            yield users
+            offset += page_size
+        return
+
     while True:
-        users = paginate_users(page_size, offset)
+        users = paginate_users(page_size, after=after, sort_key=sort_key,
+                               row_factory=row_factory)
         if not users:
             break
         yield users
-        offset += page_size
+        last = users[-1]
+        if sort_key == 'user_id':
+            after = (last['user_id'],)
+        else:
+            after = (last[sort_key], last['user_id'])
+
+
+@managed_stream
+def lazy_paginate(page_size, keyset=False, sort_key='user_id', resume_token=None, prefetch=0,
+                  row_factory=None):
+    """
+    Generator that lazily loads paginated data using one loop.
+
+    By default pages are fetched with LIMIT/OFFSET. With keyset=True (or when
+    a resume_token is given) each page continues from the last row of the
+    previous one; use encode_resume_token(page[-1], sort_key) to checkpoint
+    progress and resume_token=... to restart from that point.
+
+    With prefetch=K, up to K pages are fetched ahead on a background thread
+    while the caller is still processing the current one. row_factory is
+    passed through to paginate_users.
+    """
+    if resume_token is not None:
+        sort_key, after = decode_resume_token(resume_token)
+        keyset = True
+    else:
+        after = None
+
+    pages = _pages(page_size, keyset, sort_key, after, row_factory)
+    if prefetch > 0:
+        pages = read_ahead(pages, prefetch, name="lazy_paginate-prefetch")
+    try:
+        yield from pages
+    finally:
+        pages.close()
+
 
 if __name__ == "__main__":
     print("📄 Lazily loading users in pages...\n")
-    for page in lazy_paginate(5)
+    for page in lazy_paginate(5, keyset=True):
         print("🔹 New Page:")
         for user in page:
             print(f"🧑 {user['name']} | 📧 {user['email']} | 🎂 {user['age']}")
+        print(f"🔖 Resume token: {encode_resume_token(page[-1])}")
         print("------------")
-
@@ -1,47 +1,84 @@
-import mysql.connector
 from mysql.connector import Error
 
-def stream_user_ages():
+import db_pool
+from managed import managed_stream
+from stream_stats import StreamSummary
+
+@managed_stream
+def stream_user_ages(raise_errors=False):
     """
     Generator that yields one user age at a time from the database.
+    Database errors are printed and end the stream, unless raise_errors=True.
     """
     try:
-        connection = mysql.connector.connect(
-            host='localhost',
-            user='root',
-            password='Legionnaire@27'
-            database='ALX_prodev'
-        )
-
-        if connection.is_connected():
-            cursor = connection.cursor()
+        with db_pool.cursor() as cursor:
             cursor.execute("SELECT age FROM user_data;")
 
             for (age,) in cursor:
                 yield age
 
-            cursor.close()
-            connection.close()
+    except Error as e:
+        if raise_errors:
+            raise
+        print(f"❌ Error: {e}")
+
+
+def fetch_age_stats():
+    """
+    Compute age statistics inside the database and return them as a dict
+    with count, mean, stddev, min and max. Only one row crosses the wire.
+    Returns None if the query failed.
+    """
+    try:
+        with db_pool.cursor() as cursor:
+            cursor.execute(
+                "SELECT COUNT(age), AVG(age), STDDEV_SAMP(age), MIN(age), MAX(age) "
+                "FROM user_data;"
+            )
+            count, mean, stddev, low, high = cursor.fetchone()
+            return {'count': count, 'mean': mean, 'stddev': stddev,
+                    'min': low, 'max': high}
 
     except Error as e:
         print(f"❌ Error: {e}")
+        return None
 
 
-def calculate_average_age():
+def summarize_ages(bin_width=10, compression=100):
+    """
+    Stream every age once and return a StreamSummary with mean/variance,
+    min/max, a histogram and approximate quantiles, in bounded memory.
+    Database errors propagate, so a partial summary is never returned.
     """
-    Uses the generator to calculate the average user age.
+    with stream_user_ages(raise_errors=True) as ages:
+        return StreamSummary(bin_width, compression).extend(ages)
+
+
+def calculate_average_age(push_down=True):
     """
-    total_age = 0
-    count = 0
+    Calculate the average user age.
 
-    for age in stream_user_ages():
-        total_age += age
-        count += 1
+    By default AVG() runs in the database; with push_down=False the ages are
+    streamed through the generator and aggregated in one pass.
+    """
+    if push_down:
+        stats = fetch_age_stats()
+        if stats is None:
+            print("❌ Could not calculate the average age.")
+            return
+        count, average = stats['count'], stats['mean']
+    else:
+        try:
+            summary = summarize_ages()
+        except Error as e:
+            print(f"❌ Could not calculate the average age: {e}")
+            return
+        count = summary.stats.count
+        average = summary.stats.mean
 
     if count == 0:
         print("No users found.")
     else:
-        average = total_age / count
         print(f"Average age of users: {average:.2f}")
 
 
@@ -0,0 +1,215 @@
+import asyncio
+import os
+import sys
+import uuid
+from contextlib import asynccontextmanager
+
+from managed import managed_async_stream
+
+try:
+    import aiomysql
+except ImportError:  # only needed for the MySQL backend
+    aiomysql = None
+
+try:
+    import aiosqlite
+except ImportError:  # only needed for the SQLite backend
+    aiosqlite = None
+
+
+class MySQLBackend:
+    """
+    aiomysql backend sharing one connection pool per backend instance.
+
+    user_id handling follows db_pool's configuration: with
+    db_pool.configure(binary_ids=True) BINARY(16) ids come back as UUID
+    strings and are bound through db_pool.user_id_param().
+
+    Like db_pool, a connection left in the middle of an unbuffered result
+    is closed rather than drained: SSCursor.close() would read the rest of
+    the result, possibly most of the table.
+    """
+
+    placeholder = '%s'
+
+    def __init__(self, max_size=10, **config):
+        if aiomysql is None:
+            raise ImportError("MySQLBackend requires the 'aiomysql' package")
+        from db_pool import DB_CONFIG
+        self._config = {**DB_CONFIG, **config}
+        self._max_size = max_size
+        self._pool = None
+
+    @asynccontextmanager
+    async def cursor(self):
+        if self._pool is None:
+            config = dict(self._config)
+            config['db'] = config.pop('database', None)
+            self._pool = await aiomysql.create_pool(maxsize=self._max_size, **config)
+        pool = self._pool
+        connection = await pool.acquire()
+        try:
+            # SSDictCursor streams rows from the server instead of buffering.
+            cursor = await connection.cursor(aiomysql.SSDictCursor)
+            try:
+                yield cursor
+            except BaseException:
+                # Stopped early (error, aclose or cancellation), possibly
+                # with rows left unread: drop the connection instead.
+                connection.close()
+                raise
+            await cursor.close()
+        finally:
+            await pool.release(connection)
+
+    async def close(self):
+        if self._pool is not None:
+            self._pool.close()
+            await self._pool.wait_closed()
+            self._pool = None
+
+    def user_id_param(self, value):
+        import db_pool
+        return db_pool.user_id_param(value)
+
+    def convert(self, rows):
+        import db_pool
+        if db_pool.get_pool().binary_ids:
+            for row in rows:
+                if isinstance(row.get('user_id'), (bytes, bytearray)):
+                    row['user_id'] = str(uuid.UUID(bytes=bytes(row['user_id'])))
+        return rows
+
+
+class SQLiteBackend:
+    """
+    aiosqlite backend for running the streams against an existing database
+    file holding a user_data table, e.g. one made by benchmark.seed().
+    """
+
+    placeholder = '?'
+
+    def __init__(self, path):
+        if aiosqlite is None:
+            raise ImportError("SQLiteBackend requires the 'aiosqlite' package")
+        # aiosqlite would silently create an empty database for a wrong path.
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"SQLite database not found: {path}")
+        self.path = path
+
+    @asynccontextmanager
+    async def cursor(self):
+        async with aiosqlite.connect(self.path) as db:
+            db.row_factory = lambda cur, row: dict(zip((c[0] for c in cur.description), row))
+            async with db.cursor() as cursor:
+                yield cursor
+
+    async def close(self):
+        pass
+
+    def user_id_param(self, value):
+        return value
+
+    def convert(self, rows):
+        return rows
+
+
+_default_backend = None
+
+
+def _backend(backend):
+    global _default_backend
+    if backend is not None:
+        return backend
+    if _default_backend is None:
+        _default_backend = MySQLBackend()
+    return _default_backend
+
+
+@managed_async_stream
+async def stream_users(backend=None, chunk_size=1000):
+    """
+    Async generator that yields rows one by one from user_data table.
+    Use 'async with stream_users(...) as rows:' (or call rows.aclose()) to
+    release the connection as soon as you stop early.
+    """
+    backend = _backend(backend)
+    async with backend.cursor() as cursor:
+        await cursor.execute("SELECT * FROM user_data")
+        while True:
+            rows = await cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            for row in backend.convert(rows):
+                yield row
+
+
+@managed_async_stream
+async def stream_users_in_batches(batch_size, backend=None):
+    """Async generator that yields lists of up to batch_size user rows."""
+    backend = _backend(backend)
+    async with backend.cursor() as cursor:
+        await cursor.execute("SELECT * FROM user_data")
+        while True:
+            batch = await cursor.fetchmany(batch_size)
+            if not batch:
+                break
+            yield backend.convert(list(batch))
+
+
+@managed_async_stream
+async def lazy_paginate(page_size, backend=None, keyset=False):
+    """
+    Async generator that lazily loads pages of users. With keyset=True each
+    page seeks past the last user_id of the previous one instead of using OFFSET.
+    Every page is read on the same connection.
+    """
+    backend = _backend(backend)
+    mark = backend.placeholder
+    offset, after = 0, None
+    async with backend.cursor() as cursor:
+        while True:
+            if not keyset:
+                await cursor.execute(f"SELECT * FROM user_data LIMIT {mark} OFFSET {mark}",
+                                     (page_size, offset))
+            elif after is None:
+                await cursor.execute(f"SELECT * FROM user_data ORDER BY user_id LIMIT {mark}",
+                                     (page_size,))
+            else:
+                await cursor.execute(
+                    f"SELECT * FROM user_data WHERE user_id > {mark} ORDER BY user_id LIMIT {mark}",
+                    (backend.user_id_param(after), page_size))
+            users = backend.convert(list(await cursor.fetchall()))
+            if not users:
+                break
+            yield users
+            offset += page_size
+            after = users[-1]['user_id']
+
+
+async def _count_rows(name, stream):
+    count = 0
+    async for _ in stream:
+        count += 1
+    print(f"[{name}] {count} items")
+    return count
+
+
+async def main(path=None):
+    """
+    Drive three scans concurrently on one event loop, against 'path' or a
+    freshly seeded SQLite stand-in when no path is given.
+    """
+    if path is None:
+        from benchmark import seed
+        path = seed(1000)
+    backend = SQLiteBackend(path)
+    await asyncio.gather(
+        _count_rows("stream_users", stream_users(backend)),
+        _count_rows("stream_users_in_batches", stream_users_in_batches(100, backend)),
+        _count_rows("lazy_paginate", lazy_paginate(100, backend, keyset=True)),
+    )
+
+
+if __name__ == "__main__":
+    asyncio.run(main(sys.argv[1] if len(sys.argv) > 1 else None))
@@ -0,0 +1,73 @@
+from collections import deque
+
+from rows import row_bytes
+
+
+class BatchSizer:
+    """
+    Picks the next batch size from how the previous batches behaved.
+
+    After each fetch, record() turns the measured time and row width into an
+    ideal size: the number of rows that would take 'target_seconds' to
+    fetch, capped so a batch stays under 'max_batch_bytes'. The next size
+    moves halfway toward that ideal and at most doubles per step, which
+    damps noise from single slow fetches. The last 'history_size' decisions
+    are kept in 'history' for inspection; metrics() summarises all of them
+    from running totals, so a long stream uses constant memory.
+    """
+
+    def __init__(self, initial=100, target_seconds=0.05, max_batch_bytes=None,
+                 min_size=10, max_size=50_000, sample_rows=16, history_size=1000):
+        self.size = initial
+        self.target_seconds = target_seconds
+        self.max_batch_bytes = max_batch_bytes
+        self.min_size = min_size
+        self.max_size = max_size
+        self.sample_rows = sample_rows
+        self.history = deque(maxlen=history_size)  # dicts: size, rows, seconds, row_bytes
+        self._batches = 0
+        self._min_size = None
+        self._max_size = None
+        self._total_size = 0
+        self._total_seconds = 0.0
+        self._total_row_bytes = 0.0
+
+    def record(self, rows, seconds):
+        """Update the size from a fetched batch and the time it took."""
+        count = len(rows)
+        if count == 0:
+            return self.size
+        sample = rows[:self.sample_rows]
+        width = sum(map(row_bytes, sample)) / len(sample)
+        self.history.append({'size': self.size, 'rows': count,
+                             'seconds': seconds, 'row_bytes': width})
+        self._batches += 1
+        self._min_size = self.size if self._min_size is None else min(self._min_size, self.size)
+        self._max_size = self.size if self._max_size is None else max(self._max_size, self.size)
+        self._total_size += self.size
+        self._total_seconds += seconds
+        self._total_row_bytes += width
+
+        ideal = self.max_size
+        if seconds > 0:
+            ideal = self.target_seconds * count / seconds
+        if self.max_batch_bytes:
+            ideal = min(ideal, self.max_batch_bytes / width)
+        proposed = int((self.size + ideal) / 2)
+        self.size = max(self.min_size, min(self.max_size, proposed, self.size * 2))
+        return self.size
+
+    def metrics(self):
+        """Summary of the sizes chosen so far."""
+        batches = self._batches
+        if not batches:
+            return {'batches': 0}
+        return {
+            'batches': batches,
+            'current_size': self.size,
+            'min_size': self._min_size,
+            'max_size': self._max_size,
+            'mean_size': self._total_size / batches,
+            'mean_seconds': self._total_seconds / batches,
+            'mean_row_bytes': self._total_row_bytes / batches,
+        }
@@ -0,0 +1,297 @@
+"""
+Benchmark the user_data access patterns against a local SQLite stand-in.
+
+Each case runs in its own subprocess so peak RSS belongs to that case alone.
+The generators run unchanged: db_pool is pointed at SQLiteConnection, an
+adapter that gives sqlite3 the parts of the mysql.connector interface they
+use. Results are written as JSON for comparison between runs.
+
+    python3 benchmark.py --rows 10000 100000 --batch-sizes 100 1000 -o results.json
+    python3 benchmark.py --rows 10000 100000 --compare results.json
+"""
+import argparse
+import importlib
+import json
+import os
+import platform
+import resource
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+
+import db_pool
+
+DEFAULT_DB_DIR = tempfile.gettempdir()
+
+
+class SQLiteCursor:
+    """sqlite3 cursor with mysql.connector's %s placeholders, dictionary rows and buffering."""
+
+    def __init__(self, connection, dictionary=False, buffered=False):
+        self.connection = connection
+        self.dictionary = dictionary
+        self.buffered = buffered
+        self.column_names = ()
+        self._cursor = connection.raw.cursor()
+        self._rows = None
+
+    def execute(self, query, params=()):
+        self._cursor.execute(query.replace('%s', '?'), tuple(params))
+        self.column_names = tuple(d[0] for d in self._cursor.description or ())
+        self._rows = iter(self._cursor.fetchall()) if self.buffered else self._cursor
+        self.connection.unread_result = not self.buffered
+
+    def _convert(self, rows):
+        if self.dictionary:
+            return [dict(zip(self.column_names, row)) for row in rows]
+        return rows
+
+    def fetchmany(self, size=1):
+        rows = [row for _, row in zip(range(size), self._rows)]
+        if len(rows) < size:
+            self.connection.unread_result = False
+        return self._convert(rows)
+
+    def fetchall(self):
+        rows = list(self._rows)
+        self.connection.unread_result = False
+        return self._convert(rows)
+
+    def fetchone(self):
+        rows = self.fetchmany(1)
+        return rows[0] if rows else None
+
+    def __iter__(self):
+        while True:
+            row = self.fetchone()
+            if row is None:
+                return
+            yield row
+
+    def close(self):
+        self._cursor.close()
+        self.connection.unread_result = False
+
+
+class SQLiteConnection:
+    """The subset of a mysql.connector connection that db_pool and the generators use."""
+
+    opened = 0
+
+    def __init__(self, path):
+        SQLiteConnection.opened += 1
+        self.raw = sqlite3.connect(path, check_same_thread=False)
+        self.unread_result = False
+        self._open = True
+
+    def cursor(self, dictionary=False, buffered=False):
+        return SQLiteCursor(self, dictionary, buffered)
+
+    def ping(self, reconnect=False):
+        if not self._open:
+            raise db_pool.Error(msg="connection closed")
+
+    def is_connected(self):
+        return self._open
+
+    def rollback(self):
+        self.raw.rollback()
+
+    def close(self):
+        if self._open:
+            self._open = False
+            self.raw.close()
+
+
+def seed(rows, db_dir=DEFAULT_DB_DIR):
+    """Create (once) and return the path of a SQLite user_data table with 'rows' rows."""
+    path = os.path.join(db_dir, f"alx_prodev_bench_{rows}.db")
+    if os.path.exists(path):
+        return path
+    tmp = path + ".tmp"
+    conn = sqlite3.connect(tmp)
+    conn.execute("CREATE TABLE user_data (user_id TEXT PRIMARY KEY, name TEXT NOT NULL, "
+                 "email TEXT NOT NULL, age INTEGER NOT NULL)")
+    conn.executemany("INSERT INTO user_data VALUES (?, ?, ?, ?)",
+                     ((str(uuid.uuid4()), f"User {i}", f"user{i}@example.com", 18 + i % 80)
+                      for i in range(rows)))
+    conn.commit()
+    conn.close()
+    os.replace(tmp, path)
+    return path
+
+
+def _fetchall():
+    with db_pool.cursor(dictionary=True) as cursor:
+        cursor.execute("SELECT * FROM user_data;")
+        yield from cursor.fetchall()
+
+
+def _flatten(batches):
+    for batch in batches:
+        yield from batch
+
+
+def _patterns():
+    stream_users = importlib.import_module('0-stream_users').stream_users
+    stream_users_in_batches = importlib.import_module('1-batch_processing').stream_users_in_batches
+    lazy_paginate = importlib.import_module('2-lazy_paginate').lazy_paginate
+    # name -> (uses batch_size, factory(batch_size) returning an iterator of rows)
+    return {
+        'fetchall': (False, lambda size: _fetchall()),
+        'stream_users': (False, lambda size: stream_users()),
+        'stream_users_unbuffered': (True, lambda size: stream_users(stream=True, chunk_size=size)),
+        'stream_users_in_batches': (True, lambda size: _flatten(stream_users_in_batches(size))),
+        'lazy_paginate_offset': (True, lambda size: _flatten(lazy_paginate(size))),
+        'lazy_paginate_keyset': (True, lambda size: _flatten(lazy_paginate(size, keyset=True))),
+    }
+
+
+def _peak_rss_bytes():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes.
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def run_case(pattern, batch_size, db_path):
+    """Run one access pattern in this process and return its measurements."""
+    db_pool.configure(max_size=4, connect=lambda: SQLiteConnection(db_path))
+    factory = _patterns()[pattern][1]
+    baseline_rss = _peak_rss_bytes()
+
+    start = time.perf_counter()
+    first_row = None
+    count = 0
+    for _ in factory(batch_size):
+        if first_row is None:
+            first_row = time.perf_counter() - start
+        count += 1
+    elapsed = time.perf_counter() - start
+
+    stats = db_pool.get_pool().stats()
+    return {
+        'pattern': pattern,
+        'batch_size': batch_size,
+        'rows': count,
+        'seconds': elapsed,
+        'rows_per_sec': count / elapsed if elapsed > 0 else 0.0,
+        'time_to_first_row': first_row,
+        'peak_rss_bytes': _peak_rss_bytes(),
+        'baseline_rss_bytes': baseline_rss,
+        'connections_opened': SQLiteConnection.opened,
+        'connections_in_use_after': stats['in_use'],
+    }
+
+
+def _run_in_subprocess(pattern, batch_size, db_path):
+    output = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), '--case', pattern,
+         '--batch-size', str(batch_size), '--db', db_path],
+        check=True, capture_output=True, text=True,
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def run_suite(row_counts=(10_000,), batch_sizes=(100, 1000), patterns=None, repeat=1,
+              db_dir=DEFAULT_DB_DIR):
+    """
+    Benchmark every pattern at every table size and, where a pattern takes
+    one, every batch size. Returns a dict with environment details and one
+    result per run.
+    """
+    available = _patterns()
+    patterns = patterns or list(available)
+    results = []
+    for rows in row_counts:
+        db_path = seed(rows, db_dir)
+        for pattern in patterns:
+            sizes = batch_sizes if available[pattern][0] else [None]
+            for size in sizes:
+                for run in range(repeat):
+                    result = _run_in_subprocess(pattern, size or 0, db_path)
+                    result.update(table_rows=rows, run=run, batch_size=size)
+                    results.append(result)
+                    print(f"⏱️  {rows:>9,} rows | {pattern:<24} | batch {str(size or '-'):>6} | "
+                          f"{result['rows_per_sec']:>12,.0f} rows/sec | "
+                          f"first row {result['time_to_first_row'] * 1000:8.2f} ms | "
+                          f"peak RSS {result['peak_rss_bytes'] / 1e6:7.1f} MB | "
+                          f"{result['connections_opened']} conn", file=sys.stderr)
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'backend': f"sqlite {sqlite3.sqlite_version}",
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'results': results,
+    }
+
+
+def compare(baseline, current, tolerance=0.10):
+    """
+    Match results from two reports by (table_rows, pattern, batch_size) and
+    return the cases whose mean rows/sec dropped by more than 'tolerance'.
+    """
+    def means(report):
+        grouped = {}
+        for r in report['results']:
+            grouped.setdefault((r['table_rows'], r['pattern'], r['batch_size']), []).append(
+                r['rows_per_sec'])
+        return {key: sum(v) / len(v) for key, v in grouped.items()}
+
+    before, after = means(baseline), means(current)
+    regressions = []
+    for key in sorted(before.keys() & after.keys(), key=str):
+        change = (after[key] - before[key]) / before[key] if before[key] else 0.0
+        if change < -tolerance:
+            rows, pattern, size = key
+            regressions.append({'table_rows': rows, 'pattern': pattern, 'batch_size': size,
+                                'baseline_rows_per_sec': before[key],
+                                'rows_per_sec': after[key], 'change': change})
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, nargs='+', default=[10_000])
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[100, 1000])
+    parser.add_argument('--patterns', nargs='+', choices=sorted(_patterns()))
+    parser.add_argument('--repeat', type=int, default=1)
+    parser.add_argument('--db-dir', default=DEFAULT_DB_DIR)
+    parser.add_argument('-o', '--output', help="write JSON here instead of stdout")
+    parser.add_argument('--compare', metavar='BASELINE_JSON',
+                        help="exit non-zero if throughput fell against this earlier report")
+    parser.add_argument('--tolerance', type=float, default=0.10)
+    # Internal: run a single case in this process.
+    parser.add_argument('--case', help=argparse.SUPPRESS)
+    parser.add_argument('--batch-size', type=int, help=argparse.SUPPRESS)
+    parser.add_argument('--db', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.case:
+        print(json.dumps(run_case(args.case, args.batch_size, args.db)))
+        return
+
+    report = run_suite(args.rows, args.batch_sizes, args.patterns, args.repeat, args.db_dir)
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+        print(f"✅ Wrote {len(report['results'])} results to {args.output}", file=sys.stderr)
+    else:
+        print(text)
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(json.load(f), report, args.tolerance)
+        for r in regressions:
+            print(f"⚠️  {r['pattern']} ({r['table_rows']:,} rows, batch {r['batch_size']}): "
+                  f"{r['change']:+.0%} rows/sec", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+import queue
+import threading
+from contextlib import closing
+
+_END = object()
+
+
+class _Subscriber:
+    """One registered consumer and, if threaded, its bounded inbox."""
+
+    def __init__(self, name, fn, threaded, buffer_batches):
+        self.name = name
+        self.fn = fn
+        self.threaded = threaded
+        self.inbox = queue.Queue(maxsize=buffer_batches) if threaded else None
+        self.finished = threading.Event()
+        self.result = None
+        self.error = None
+        self.thread = None
+
+    def _batches(self):
+        while True:
+            batch = self.inbox.get()
+            if batch is _END:
+                return
+            yield batch
+
+    def _run(self):
+        try:
+            self.result = self.fn(self._batches())
+        except Exception as e:
+            self.error = e
+        finally:
+            # Stop the producer from waiting on a consumer that has left.
+            self.finished.set()
+
+    def start(self):
+        if self.threaded:
+            self.thread = threading.Thread(target=self._run, name=f"broadcast-{self.name}",
+                                           daemon=True)
+            self.thread.start()
+
+    def deliver(self, batch):
+        """Hand over one batch, blocking while this consumer's inbox is full."""
+        if self.finished.is_set():
+            return
+        if not self.threaded:
+            try:
+                self.fn(batch)
+            except Exception as e:
+                self.error = e
+                self.finished.set()
+            return
+        while not self.finished.is_set():
+            try:
+                self.inbox.put(batch, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+
+class Broadcast:
+    """
+    Run one scan and fan its batches out to several consumers.
+
+        fanout = Broadcast(lambda: stream_users_in_batches(500))
+        fanout.register(age_stats)                 # fn(batches) on its own thread
+        fanout.register(validate, threaded=False)  # fn(batch) inline per batch
+        results = fanout.run()
+
+    Threaded consumers receive an iterator of batches and their return value
+    becomes their result. Each has a bounded inbox of 'buffer_batches', and
+    the scan waits whenever any inbox is full, so the slowest consumer sets
+    the pace and memory stays bounded. Inline consumers are called with each
+    batch on the scanning thread. The same batch object goes to every
+    consumer, so consumers must not modify it. A consumer that raises or
+    returns early is detached and the scan carries on for the others.
+    """
+
+    def __init__(self, source, buffer_batches=8):
+        """'source' is a zero-argument callable returning an iterable of batches."""
+        self.source = source
+        self.buffer_batches = buffer_batches
+        self._subscribers = []
+
+    def register(self, fn, threaded=True, name=None):
+        name = name or getattr(fn, '__name__', f"consumer{len(self._subscribers)}")
+        self._subscribers.append(_Subscriber(name, fn, threaded, self.buffer_batches))
+        return name
+
+    def run(self):
+        """
+        Perform the scan once. Returns {name: result}; if a consumer failed,
+        the first error is re-raised after every consumer has finished.
+        """
+        subscribers = self._subscribers
+        for sub in subscribers:
+            sub.start()
+        try:
+            with closing(self.source()) as batches:
+                for batch in batches:
+                    for sub in subscribers:
+                        sub.deliver(batch)
+                    if all(sub.finished.is_set() for sub in subscribers):
+                        break
+        finally:
+            for sub in subscribers:
+                if sub.threaded:
+                    sub.deliver(_END)
+                    sub.thread.join()
+
+        for sub in subscribers:
+            if sub.error is not None:
+                raise sub.error
+        return {sub.name: sub.result for sub in subscribers}
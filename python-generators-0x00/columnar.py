@@ -0,0 +1,80 @@
+from array import array
+from itertools import compress
+
+from predicates import OPERATORS
+
+try:
+    import numpy as np
+except ImportError:  # numpy is optional; fall back to the array module
+    np = None
+
+# Columns stored as packed integers rather than Python objects.
+INT_COLUMNS = {'age'}
+
+# Comparison operators that NumPy evaluates element-wise in one call.
+VECTOR_OPS = {'=', '!=', '<', '<=', '>', '>='}
+
+
+def _int_column(values):
+    if np is not None:
+        return np.fromiter((int(v) for v in values), dtype=np.int16, count=len(values))
+    return array('h', (int(v) for v in values))
+
+
+class ColumnBatch:
+    """
+    A batch of rows stored column by column.
+
+    Integer columns (age) are packed into a NumPy int16 array, or an
+    array('h') without NumPy, so numeric filters and aggregates can run over
+    the whole batch; string columns are plain lists.
+    """
+
+    __slots__ = ('names', 'columns', 'length')
+
+    def __init__(self, names, columns, length):
+        self.names = names
+        self.columns = columns
+        self.length = length
+
+    @classmethod
+    def from_rows(cls, names, rows):
+        """Build a batch from tuple rows whose fields are ordered like 'names'."""
+        names = tuple(names)
+        transposed = list(zip(*rows)) if rows else [()] * len(names)
+        columns = {}
+        for name, values in zip(names, transposed):
+            columns[name] = _int_column(values) if name in INT_COLUMNS else list(values)
+        return cls(names, columns, len(rows))
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    def mask(self, column, op, value):
+        """Return a boolean mask for 'column op value' over the whole batch."""
+        data = self.columns[column]
+        fn = OPERATORS[op.upper()]
+        if np is not None and isinstance(data, np.ndarray) and op in VECTOR_OPS:
+            return fn(data, value)
+        return [fn(v, value) for v in data]
+
+    def select(self, mask):
+        """Return a new batch with only the rows where mask is true."""
+        columns = {}
+        for name, data in self.columns.items():
+            if np is not None and isinstance(data, np.ndarray):
+                columns[name] = data[np.asarray(mask, dtype=bool)]
+            elif isinstance(data, array):
+                columns[name] = array(data.typecode, compress(data, mask))
+            else:
+                columns[name] = list(compress(data, mask))
+        length = len(next(iter(columns.values()))) if columns else 0
+        return ColumnBatch(self.names, columns, length)
+
+    def rows(self):
+        """Yield the batch back as row dictionaries."""
+        for values in zip(*(self.columns[n] for n in self.names)):
+            yield dict(zip(self.names, values))
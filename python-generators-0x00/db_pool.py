@@ -0,0 +1,240 @@
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+
+import mysql.connector
+from mysql.connector import Error
+from mysql.connector.conversion import MySQLConverter
+
+# Connection settings shared by every generator in this project.
+DB_CONFIG = {
+    'host': 'localhost',
+    'user': 'root',
+    'password': 'Legionnaire@27',
+    'database': 'ALX_prodev',
+}
+
+
+class PoolTimeout(Error):
+    """Raised when no connection becomes available within the checkout timeout."""
+
+
+class BinaryUUIDConverter(MySQLConverter):
+    """Return BINARY(16) values as canonical UUID strings."""
+
+    def _STRING_to_python(self, value, dsc=None):
+        result = super()._STRING_to_python(value, dsc)
+        if isinstance(result, (bytes, bytearray)) and len(result) == 16:
+            return str(uuid.UUID(bytes=bytes(result)))
+        return result
+
+
+class ConnectionPool:
+    """
+    A small, thread-safe pool of MySQL connections.
+
+    - At most 'max_size' connections exist at once (idle + checked out).
+    - Every checkout health-checks the connection and transparently replaces
+      it if the server dropped it.
+    - Connections idle for longer than 'max_idle' seconds are closed instead
+      of being handed out again.
+
+    Connection options passed as keywords (e.g. host='db2') override the
+    matching DB_CONFIG entries and keep the rest.
+
+    With binary_ids=True (a table created by seed.create_table(binary_ids=True))
+    user_id values come back as UUID strings; pass key values through
+    user_id_param() before binding them.
+    """
+
+    def __init__(self, max_size=5, max_idle=300, timeout=30, connect=None,
+                 binary_ids=False, **config):
+        self.max_size = max_size
+        self.max_idle = max_idle
+        self.timeout = timeout
+        self.binary_ids = binary_ids
+        self._config = {**DB_CONFIG, **config}
+        if binary_ids:
+            self._config['converter_class'] = BinaryUUIDConverter
+        self._custom_connect = connect
+        self._connect = connect or (lambda: mysql.connector.connect(**self._config))
+        self._idle = deque()  # (connection, returned_at), most recent on the right
+        self._size = 0
+        self._cond = threading.Condition()
+        self.connects = 0  # number of real handshakes performed
+
+    def _evict_idle(self, now):
+        """Close idle connections that have exceeded max_idle. Caller holds the lock."""
+        while self._idle and now - self._idle[0][1] > self.max_idle:
+            conn, _ = self._idle.popleft()
+            self._discard(conn)
+
+    def _discard(self, conn):
+        """Close a connection and free its slot. Caller holds the lock."""
+        self._size -= 1
+        try:
+            conn.close()
+        except Error:
+            pass
+        self._cond.notify()
+
+    @staticmethod
+    def _is_healthy(conn):
+        try:
+            conn.ping(reconnect=False)
+            return True
+        except (Error, AttributeError):
+            return False
+
+    def acquire(self, timeout=None):
+        """Check out a healthy connection, blocking while the pool is exhausted."""
+        timeout = self.timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while True:
+                self._evict_idle(time.monotonic())
+                if self._idle:
+                    conn, _ = self._idle.pop()
+                    if self._is_healthy(conn):
+                        return conn
+                    self._discard(conn)
+                    continue
+                if self._size < self.max_size:
+                    self._size += 1
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not self._cond.wait(remaining):
+                    raise PoolTimeout(msg=f"No connection available after {timeout}s")
+
+        # Connect outside the lock so a slow handshake doesn't block returns.
+        try:
+            conn = self._connect()
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+        self.connects += 1
+        return conn
+
+    def release(self, conn):
+        """
+        Return a connection to the pool, ending any open transaction first.
+        A connection abandoned in the middle of an unbuffered result is
+        closed rather than drained, since draining could mean reading the
+        rest of a very large table. A successful rollback already proves the
+        connection is alive, so no extra ping is sent here; acquire() checks
+        it again on the next checkout.
+        """
+        healthy = False
+        if not getattr(conn, 'unread_result', False):
+            try:
+                conn.rollback()
+                healthy = True
+            except Error:
+                pass
+        with self._cond:
+            if healthy:
+                self._idle.append((conn, time.monotonic()))
+                self._cond.notify()
+            else:
+                self._discard(conn)
+
+    @contextmanager
+    def connection(self, timeout=None):
+        """Context manager that checks out a connection and always returns it."""
+        conn = self.acquire(timeout)
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def close(self):
+        """Close every idle connection. Checked-out connections close on release."""
+        with self._cond:
+            while self._idle:
+                conn, _ = self._idle.popleft()
+                self._discard(conn)
+
+    def settings(self):
+        """
+        The options this pool was created with (except max_size), so another
+        process can build an equivalent pool with configure(**settings).
+        """
+        options = {k: v for k, v in self._config.items() if k != 'converter_class'}
+        options.update(max_idle=self.max_idle, timeout=self.timeout, binary_ids=self.binary_ids)
+        if self._custom_connect is not None:
+            options['connect'] = self._custom_connect
+        return options
+
+    def stats(self):
+        """Return a snapshot of pool usage."""
+        with self._cond:
+            idle = len(self._idle)
+            return {'size': self._size, 'idle': idle,
+                    'in_use': self._size - idle, 'connects': self.connects}
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Return the module-level pool, creating it on first use."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ConnectionPool()
+        return _pool
+
+
+def configure(**options):
+    """
+    Replace the module-level pool, e.g. configure(max_size=10, max_idle=60).
+    Idle connections of the previous pool are closed.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+        _pool = ConnectionPool(**options)
+        return _pool
+
+
+def connection(timeout=None):
+    """Shortcut for get_pool().connection()."""
+    return get_pool().connection(timeout)
+
+
+def user_id_param(value):
+    """Convert a user_id string into the form the table stores it in."""
+    if value is not None and get_pool().binary_ids:
+        return uuid.UUID(str(value)).bytes
+    return value
+
+
+@contextmanager
+def open_cursor(conn, **options):
+    """
+    Open a cursor on 'conn' and close it on exit, even when the caller
+    stops before reading the whole result.
+    """
+    cursor = conn.cursor(**options)
+    try:
+        yield cursor
+    finally:
+        try:
+            cursor.close()
+        except Error:
+            # Unread rows on an unbuffered cursor; the pool discards the
+            # connection on release instead.
+            pass
+
+
+@contextmanager
+def cursor(timeout=None, **options):
+    """Check out a pooled connection and open a cursor on it in one step."""
+    with connection(timeout) as conn, open_cursor(conn, **options) as cur:
+        yield cur
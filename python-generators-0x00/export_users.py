@@ -0,0 +1,195 @@
+import csv
+import datetime
+import gzip
+import importlib
+import io
+import json
+import os
+import sys
+import time
+from decimal import Decimal
+
+from mysql.connector import Error
+
+try:
+    import zstandard
+except ImportError:  # zstd output is optional
+    zstandard = None
+
+stream_users = importlib.import_module('0-stream_users').stream_users
+
+EXTENSIONS = {'ndjson': 'ndjson', 'csv': 'csv'}
+COMPRESSIONS = {None: '', 'gzip': '.gz', 'zstd': '.zst'}
+PARTIAL_SUFFIX = '.partial'
+
+
+class _PartWriter:
+    """
+    Compressed output split into numbered part files of about part_bytes each.
+    Parts are written under a '.partial' suffix and only renamed to their
+    final names by commit(); abort() deletes them instead.
+    """
+
+    def __init__(self, prefix, fmt, compression, part_bytes):
+        if compression == 'zstd' and zstandard is None:
+            raise ImportError("zstd output requires the 'zstandard' package")
+        self.prefix = prefix
+        self.fmt = fmt
+        self.compression = compression
+        self.part_bytes = part_bytes
+        self.paths = []
+        self.bytes_written = 0
+        self._raw = self._out = None
+
+    def _open(self):
+        suffix = f".part{len(self.paths):04d}" if self.part_bytes else ""
+        path = f"{self.prefix}{suffix}.{EXTENSIONS[self.fmt]}{COMPRESSIONS[self.compression]}"
+        self._raw = open(path + PARTIAL_SUFFIX, 'wb')
+        if self.compression == 'gzip':
+            self._out = gzip.GzipFile(fileobj=self._raw, mode='wb')
+        elif self.compression == 'zstd':
+            self._out = zstandard.ZstdCompressor().stream_writer(self._raw, closefd=False)
+        else:
+            self._out = self._raw
+        self.paths.append(path)
+
+    def _close_part(self):
+        if self._out is not self._raw:
+            self._out.close()
+        self.bytes_written += self._raw.tell()
+        self._raw.close()
+        self._raw = self._out = None
+
+    def write(self, data, header=b''):
+        """Write one encoded block, starting a new part first if this one is full."""
+        if self._raw is not None and self.part_bytes and self._raw.tell() >= self.part_bytes:
+            self._close_part()
+        if self._raw is None:
+            self._open()
+            self._out.write(header)
+        self._out.write(data)
+        self._out.flush()
+
+    def close(self):
+        if self._raw is not None:
+            self._close_part()
+
+    def commit(self):
+        """Finish the last part and give every part its final name."""
+        self.close()
+        for path in self.paths:
+            os.replace(path + PARTIAL_SUFFIX, path)
+
+    def abort(self):
+        """Close and delete every part written so far."""
+        try:
+            self.close()
+        finally:
+            for path in self.paths:
+                try:
+                    os.remove(path + PARTIAL_SUFFIX)
+                except FileNotFoundError:
+                    pass
+
+
+def _json_default(value):
+    """Encode the column types json cannot: DECIMAL as a number, dates and times as text."""
+    if isinstance(value, Decimal):
+        # age is DECIMAL(3,0) in the default schema; keep it an integer.
+        return int(value) if value == value.to_integral_value() else float(value)
+    if isinstance(value, (datetime.date, datetime.time, datetime.timedelta)):
+        return str(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _encode_ndjson(rows):
+    return ''.join(json.dumps(row, default=_json_default) + '\n' for row in rows)
+
+
+def _encode_csv(rows, fields):
+    buffer = io.StringIO()
+    csv.DictWriter(buffer, fieldnames=fields, extrasaction='ignore').writerows(rows)
+    return buffer.getvalue()
+
+
+def export_users(prefix='user_data', fmt='ndjson', compression='gzip',
+                 part_size_mb=None, chunk_size=1000, buffer_bytes=1024 * 1024):
+    """
+    Stream user_data into compressed NDJSON or CSV files in constant memory.
+
+    Rows are read with the unbuffered stream_users mode, encoded into a text
+    buffer and handed to the compressor whenever the buffer passes
+    buffer_bytes. With part_size_mb, output rolls over to a new numbered part
+    file once the current one reaches that compressed size; CSV parts each
+    get their own header. Returns a dict with files, rows, bytes and rates.
+
+    Files only appear under their final names once the whole table has been
+    exported. If reading or writing fails part-way, the partial files are
+    deleted and the error is raised.
+    """
+    if fmt not in EXTENSIONS:
+        raise ValueError(f"Unsupported format: {fmt!r}")
+    if compression not in COMPRESSIONS:
+        raise ValueError(f"Unsupported compression: {compression!r}")
+
+    part_bytes = int(part_size_mb * 1024 * 1024) if part_size_mb else None
+    writer = _PartWriter(prefix, fmt, compression, part_bytes)
+    fields, header = None, b''
+    pending, pending_size = [], 0
+    rows_written = 0
+    start = time.perf_counter()
+
+    def flush():
+        nonlocal pending, pending_size
+        if pending:
+            text = _encode_ndjson(pending) if fmt == 'ndjson' else _encode_csv(pending, fields)
+            writer.write(text.encode('utf-8'), header)
+            pending, pending_size = [], 0
+
+    try:
+        with stream_users(stream=True, chunk_size=chunk_size, raise_errors=True) as rows:
+            for row in rows:
+                if fields is None:
+                    fields = list(row.keys())
+                    if fmt == 'csv':
+                        buffer = io.StringIO()
+                        csv.writer(buffer).writerow(fields)
+                        header = buffer.getvalue().encode('utf-8')
+                pending.append(row)
+                # Rough per-row size; exact accounting isn't needed for a bound.
+                pending_size += 32 + sum(len(str(v)) for v in row.values())
+                rows_written += 1
+                if pending_size >= buffer_bytes:
+                    flush()
+            flush()
+    except BaseException:
+        writer.abort()
+        raise
+    writer.commit()
+
+    elapsed = time.perf_counter() - start
+    stats = {
+        'files': writer.paths,
+        'rows': rows_written,
+        'bytes': writer.bytes_written,
+        'seconds': elapsed,
+        'rows_per_sec': rows_written / elapsed if elapsed > 0 else 0.0,
+        'mb_per_sec': writer.bytes_written / 1e6 / elapsed if elapsed > 0 else 0.0,
+    }
+    print(f"📦 Exported {rows_written} users to {len(writer.paths)} file(s), "
+          f"{writer.bytes_written / 1e6:.1f} MB in {elapsed:.2f}s "
+          f"({stats['rows_per_sec']:,.0f} rows/sec, {stats['mb_per_sec']:.1f} MB/s)")
+    return stats
+
+
+if __name__ == "__main__":
+    # Usage: python3 export_users.py [ndjson|csv] [gzip|zstd|none] [part_size_mb]
+    args = sys.argv[1:] + [None] * 3
+    fmt = args[0] or 'ndjson'
+    compression = {'none': None, None: 'gzip'}.get(args[1], args[1])
+    part_size = float(args[2]) if args[2] else None
+    try:
+        export_users(fmt=fmt, compression=compression, part_size_mb=part_size)
+    except Error as e:
+        print(f"❌ Export failed, partial files removed: {e}")
+        sys.exit(1)
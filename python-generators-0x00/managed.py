@@ -0,0 +1,89 @@
+import functools
+
+
+class ManagedStream:
+    """
+    Iterator wrapper around a generator that is also a context manager.
+
+        with stream_users() as rows:
+            for row in rows:
+                ...
+
+    Leaving the 'with' block, by break, return or exception, closes the
+    generator right away, which runs its finally/with blocks and hands the
+    cursor and connection back to the pool instead of waiting for garbage
+    collection. Plain 'for row in stream_users()' keeps working as before.
+    """
+
+    __slots__ = ('_gen',)
+
+    def __init__(self, gen):
+        self._gen = gen
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return next(self._gen)
+
+    def close(self):
+        self._gen.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+
+def managed_stream(func):
+    """Decorator: make a generator function return a ManagedStream."""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        return ManagedStream(func(*args, **kwargs))
+    return wrapper
+
+
+class ManagedAsyncStream:
+    """
+    ManagedStream for async generators.
+
+        async with stream_users(backend) as rows:
+            async for row in rows:
+                ...
+
+    Leaving the 'async with' block closes the generator right away (aclose),
+    so its cursor and connection are released then rather than when the
+    generator is garbage-collected. Plain 'async for' keeps working; call
+    aclose() after breaking out of one early.
+    """
+
+    __slots__ = ('_gen',)
+
+    def __init__(self, gen):
+        self._gen = gen
+
+    def __aiter__(self):
+        return self
+
+    def __anext__(self):
+        return self._gen.__anext__()
+
+    async def aclose(self):
+        await self._gen.aclose()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.aclose()
+        return False
+
+
+def managed_async_stream(func):
+    """Decorator: make an async generator function return a ManagedAsyncStream."""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        return ManagedAsyncStream(func(*args, **kwargs))
+    return wrapper
@@ -0,0 +1,180 @@
+import multiprocessing
+import os
+import pickle
+import queue
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+
+import db_pool
+
+
+def key_ranges(partitions):
+    """
+    Split user_data into up to 'partitions' contiguous user_id ranges of
+    roughly equal row counts. Returns [(low, high), ...] where low is
+    inclusive, high is exclusive and None means unbounded.
+
+    The boundaries are spaced evenly between the smallest and largest
+    user_id, read with two primary-key seeks, so no rows are scanned before
+    the workers start. Random (UUIDv4) ids spread evenly over that interval;
+    time-ordered UUIDv7 ids (binary_ids) spread like the insert times, so
+    ranges are balanced when rows arrived at a steady rate and skewed
+    toward busy periods otherwise.
+    """
+    with db_pool.cursor() as cursor:
+        cursor.execute("SELECT MIN(user_id), MAX(user_id) FROM user_data;")
+        low, high = cursor.fetchone()
+    if low is None or partitions < 2:
+        return [(None, None)]
+
+    first, last = uuid.UUID(str(low)).int, uuid.UUID(str(high)).int
+    boundaries = []
+    for i in range(1, partitions):
+        boundary = first + (last - first) * i // partitions
+        if boundary > first and (not boundaries or boundary > boundaries[-1]):
+            boundaries.append(boundary)
+
+    edges = [None] + [str(uuid.UUID(int=b)) for b in boundaries] + [None]
+    return list(zip(edges[:-1], edges[1:]))
+
+
+def _put(out, item, stop):
+    """Put onto the shared queue, giving up once the consumer has stopped."""
+    while not stop.is_set():
+        try:
+            out.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _init_worker(settings):
+    """Give each worker process a one-connection pool configured like the parent's."""
+    db_pool.configure(**dict(settings, max_size=1))
+
+
+def _worker_settings():
+    """The parent pool's settings, checked to be transferable to spawned workers."""
+    settings = db_pool.get_pool().settings()
+    try:
+        pickle.dumps(settings)
+    except (pickle.PicklingError, AttributeError, TypeError) as e:
+        raise ValueError("parallel_scan needs a pool configured with a picklable 'connect' "
+                         f"(a module-level function or class), got: {e}") from e
+    return settings
+
+
+def _scan_range(index, low, high, func, out, stop, batch_size):
+    """Worker: stream one key range, apply func and ship results in batches."""
+    clauses, params = [], []
+    if low is not None:
+        clauses.append("user_id >= %s")
+        params.append(db_pool.user_id_param(low))
+    if high is not None:
+        clauses.append("user_id < %s")
+        params.append(db_pool.user_id_param(high))
+    where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+
+    with db_pool.cursor(dictionary=True, buffered=False) as cursor:
+        cursor.execute(f"SELECT * FROM user_data{where} ORDER BY user_id;", params)
+        while not stop.is_set():
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            if func is not None:
+                rows = [r for r in map(func, rows) if r is not None]
+            if rows and not _put(out, (index, rows), stop):
+                return
+    _put(out, (index, None), stop)
+
+
+def _get(out, futures):
+    """Take the next (index, batch) from a queue, re-raising any worker failure meanwhile."""
+    while True:
+        try:
+            return out.get(timeout=0.5)
+        except queue.Empty:
+            for future in futures:
+                if future.done() and future.exception() is not None:
+                    raise future.exception()
+
+
+def _merge(out, futures):
+    """Yield results from the workers' shared queue as they arrive."""
+    remaining = len(futures)
+    while remaining:
+        _, batch = _get(out, futures)
+        if batch is None:
+            remaining -= 1
+        else:
+            yield from batch
+
+
+def _merge_ordered(queues, futures):
+    """
+    Yield results in key order by draining one range's queue at a time.
+    Workers for later ranges block once their own bounded queue is full,
+    so rows are never buffered in this process.
+    """
+    for out in queues:
+        while True:
+            _, batch = _get(out, futures)
+            if batch is None:
+                break
+            yield from batch
+
+
+def parallel_scan(func=None, partitions=None, ordered=False, batch_size=500, queue_size=64):
+    """
+    Scan user_data with one streaming reader per key range, each in its own
+    process, and merge the results into a single iterator.
+
+    'func' runs in the worker processes for every row, so CPU-heavy per-row
+    work scales with cores; it must be a picklable top-level function and may
+    return None to drop a row. With ordered=True rows come back in user_id
+    order and each range has its own queue of queue_size / partitions
+    batches, so workers on later ranges wait rather than their rows piling
+    up in this process; otherwise batches are yielded as soon as any worker
+    produces them. Either way at most about queue_size batches are queued.
+
+    Workers open their connections with the settings of the current
+    db_pool (see db_pool.configure); a custom 'connect' must be picklable.
+    """
+    partitions = partitions or os.cpu_count() or 1
+    settings = _worker_settings()
+    ranges = key_ranges(partitions)
+    # 'spawn' so workers never inherit the parent's pooled sockets.
+    context = multiprocessing.get_context('spawn')
+
+    with context.Manager() as manager:
+        if ordered:
+            per_range = max(2, queue_size // len(ranges))
+            queues = [manager.Queue(per_range) for _ in ranges]
+        else:
+            queues = [manager.Queue(queue_size)] * len(ranges)
+        stop = manager.Event()
+        with ProcessPoolExecutor(max_workers=len(ranges), mp_context=context,
+                                 initializer=_init_worker, initargs=(settings,)) as pool:
+            futures = [
+                pool.submit(_scan_range, i, low, high, func, queues[i], stop, batch_size)
+                for i, (low, high) in enumerate(ranges)
+            ]
+            try:
+                if ordered:
+                    yield from _merge_ordered(queues, futures)
+                else:
+                    yield from _merge(queues[0], futures)
+            finally:
+                stop.set()
+                for future in futures:
+                    future.cancel()
+
+
+def _over_25(user):
+    return user if user['age'] > 25 else None
+
+
+if __name__ == "__main__":
+    count = sum(1 for _ in parallel_scan(_over_25))
+    print(f"Users over 25 (parallel scan): {count}")
@@ -0,0 +1,211 @@
+import queue
+import threading
+from collections import deque
+from concurrent.futures import (FIRST_COMPLETED, ProcessPoolExecutor,
+                                ThreadPoolExecutor, wait)
+from contextlib import closing
+from itertools import islice
+
+_DONE = object()
+
+
+class _Failure:
+    """Carries an exception from a producer thread to the consumer."""
+
+    __slots__ = ('error',)
+
+    def __init__(self, error):
+        self.error = error
+
+
+def read_ahead(iterable, depth, name="read-ahead"):
+    """
+    Iterate 'iterable' on a background thread, keeping up to 'depth' items
+    in a bounded queue. The thread blocks while the queue is full, stops at
+    its next put once the consumer stops iterating, closes 'iterable' if it
+    can be closed, and passes its exceptions on to the consumer.
+    """
+    buffer = queue.Queue(maxsize=depth)
+    stop = threading.Event()
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                buffer.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def producer():
+        try:
+            for item in iterable:
+                if not put(item):
+                    break
+            put(_DONE)
+        except Exception as e:
+            put(_Failure(e))
+        finally:
+            _close(iterable)
+
+    worker = threading.Thread(target=producer, name=name, daemon=True)
+    worker.start()
+    try:
+        while True:
+            item = buffer.get()
+            if item is _DONE:
+                break
+            if isinstance(item, _Failure):
+                raise item.error
+            yield item
+    finally:
+        stop.set()
+        worker.join()
+
+
+def _close(obj):
+    close = getattr(obj, 'close', None)
+    if close is not None:
+        close()
+
+
+def _parallel_map(items, fn, workers, executor, ordered):
+    """
+    Apply fn with a thread or process pool, keeping at most 2 * workers
+    calls in flight so a fast source cannot run ahead of the pool.
+    """
+    pool_class = ProcessPoolExecutor if executor == 'process' else ThreadPoolExecutor
+    limit = workers * 2
+    with pool_class(max_workers=workers) as pool:
+        pending = deque() if ordered else set()
+        try:
+            for item in items:
+                if len(pending) >= limit:
+                    if ordered:
+                        yield pending.popleft().result()
+                    else:
+                        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            yield future.result()
+                future = pool.submit(fn, item)
+                if ordered:
+                    pending.append(future)
+                else:
+                    pending.add(future)
+            if ordered:
+                while pending:
+                    yield pending.popleft().result()
+            else:
+                while pending:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        yield future.result()
+        finally:
+            for future in pending:
+                future.cancel()
+
+
+def _batch(items, size):
+    iterator = iter(items)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _window(items, size, step):
+    window = deque(maxlen=size)
+    since_emit = 0
+    for item in items:
+        window.append(item)
+        since_emit += 1
+        if len(window) == size and since_emit >= step:
+            yield list(window)
+            since_emit = 0
+
+
+class Pipeline:
+    """
+    Lazily composed streaming stages over any iterable, e.g.
+
+        total = (Pipeline(lambda: stream_users_in_batches(1000))
+                 .flat_map(lambda batch: batch)
+                 .filter(lambda user: user['age'] > 25)
+                 .map(enrich, workers=4)
+                 .batch(500)
+                 .buffer(4)
+                 .to(write_batches))
+
+    Each stage pulls from the one before it, so nothing is read ahead of
+    demand except where a bounded buffer is asked for: buffer(n) and the
+    in-flight window of a parallel map. Stopping early closes the source.
+    """
+
+    def __init__(self, source, stages=()):
+        self._source = source
+        self._stages = tuple(stages)
+
+    def _then(self, stage):
+        return Pipeline(self._source, self._stages + (stage,))
+
+    def map(self, fn, workers=0, executor='thread', ordered=True):
+        """Apply fn to every item; with workers > 0 run it on a thread or process pool."""
+        if workers > 0:
+            return self._then(lambda items: _parallel_map(items, fn, workers, executor, ordered))
+        return self._then(lambda items: map(fn, items))
+
+    def filter(self, predicate):
+        return self._then(lambda items: filter(predicate, items))
+
+    def flat_map(self, fn):
+        return self._then(lambda items: (out for item in items for out in fn(item)))
+
+    def batch(self, size):
+        """Group items into lists of up to 'size'."""
+        return self._then(lambda items: _batch(items, size))
+
+    def window(self, size, step=1):
+        """Sliding windows of 'size' items, emitted every 'step' items."""
+        return self._then(lambda items: _window(items, size, step))
+
+    def buffer(self, size):
+        """Run everything upstream on its own thread behind a queue of 'size' items."""
+        return self._then(lambda items: read_ahead(items, size, name="pipeline-buffer"))
+
+    def __iter__(self):
+        source = self._source() if callable(self._source) else self._source
+        chain = [source]
+        for stage in self._stages:
+            chain.append(stage(chain[-1]))
+        try:
+            yield from chain[-1]
+        finally:
+            # Close from the sink end so buffer threads stop before the
+            # source under them is closed.
+            for items in reversed(chain):
+                _close(items)
+
+    def to(self, sink):
+        """Feed the stream to sink(iterator) and return its result."""
+        with closing(iter(self)) as items:
+            return sink(items)
+
+    def collect(self):
+        return self.to(list)
+
+    def count(self):
+        return self.to(lambda items: sum(1 for _ in items))
+
+
+if __name__ == "__main__":
+    import importlib
+
+    stream_users_in_batches = importlib.import_module('1-batch_processing').stream_users_in_batches
+
+    over_25 = (Pipeline(lambda: stream_users_in_batches(500))
+               .buffer(2)
+               .flat_map(lambda batch: batch)
+               .filter(lambda user: user['age'] > 25)
+               .count())
+    print(f"🧮 {over_25} users over 25")
@@ -0,0 +1,154 @@
+import functools
+import operator
+import re
+
+# Operators that have both a SQL spelling and a Python implementation.
+OPERATORS = {
+    '=': operator.eq,
+    '!=': operator.ne,
+    '<': operator.lt,
+    '<=': operator.le,
+    '>': operator.gt,
+    '>=': operator.ge,
+    'IN': lambda a, b: a in b,
+    'NOT IN': lambda a, b: a not in b,
+    'LIKE': lambda a, b: _like_regex(b).match(str(a)) is not None,
+}
+
+_IDENTIFIER = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
+
+
+@functools.lru_cache(maxsize=128)
+def _like_regex(pattern):
+    """Translate a SQL LIKE pattern to a compiled regular expression."""
+    parts = []
+    for ch in pattern:
+        if ch == '%':
+            parts.append('.*')
+        elif ch == '_':
+            parts.append('.')
+        else:
+            parts.append(re.escape(ch))
+    return re.compile(''.join(parts) + r'\Z', re.IGNORECASE | re.DOTALL)
+
+
+class Predicate:
+    """
+    A single condition on one column, e.g. Predicate('age', '>', 25).
+
+    'op' is either one of OPERATORS, which can be pushed down to SQL, or a
+    callable taking (column_value, value) that is only evaluated in Python.
+    Predicates combine with & (AND) and | (OR).
+    """
+
+    def __init__(self, column, op, value=None):
+        if not _IDENTIFIER.match(column):
+            raise ValueError(f"Invalid column name: {column!r}")
+        if not callable(op):
+            op = op.upper()
+            if op not in OPERATORS:
+                raise ValueError(f"Unsupported operator: {op!r}")
+            if op in ('IN', 'NOT IN'):
+                value = tuple(value)
+        self.column = column
+        self.op = op
+        self.value = value
+
+    def to_sql(self):
+        """Return (sql, params), or None if this predicate is Python-only."""
+        if callable(self.op):
+            return None
+        if self.op in ('IN', 'NOT IN'):
+            if not self.value:
+                return ("1 = 0", []) if self.op == 'IN' else ("1 = 1", [])
+            marks = ', '.join(['%s'] * len(self.value))
+            return f"{self.column} {self.op} ({marks})", list(self.value)
+        return f"{self.column} {self.op} %s", [self.value]
+
+    def matches(self, row):
+        """Evaluate the predicate against a row dictionary."""
+        fn = self.op if callable(self.op) else OPERATORS[self.op]
+        return fn(row[self.column], self.value)
+
+    def __and__(self, other):
+        return And(self, other)
+
+    def __or__(self, other):
+        return Or(self, other)
+
+    def __repr__(self):
+        return f"Predicate({self.column!r}, {self.op!r}, {self.value!r})"
+
+
+class And(Predicate):
+    """All child predicates must match."""
+
+    joiner = 'AND'
+
+    def __init__(self, *predicates):
+        self.predicates = predicates
+
+    def to_sql(self):
+        compiled = [p.to_sql() for p in self.predicates]
+        if any(c is None for c in compiled):
+            return None
+        return _join(self.joiner, compiled)
+
+    def matches(self, row):
+        return all(p.matches(row) for p in self.predicates)
+
+    def __repr__(self):
+        return f"{type(self).__name__}{self.predicates!r}"
+
+
+class Or(And):
+    """At least one child predicate must match."""
+
+    joiner = 'OR'
+
+    def matches(self, row):
+        return any(p.matches(row) for p in self.predicates)
+
+
+def _join(joiner, compiled):
+    sql = f" {joiner} ".join(f"({s})" for s, _ in compiled)
+    params = [v for _, values in compiled for v in values]
+    return sql, params
+
+
+def _conjuncts(predicate):
+    """Yield the operands of (possibly nested) top-level ANDs."""
+    if type(predicate) is And:
+        for child in predicate.predicates:
+            yield from _conjuncts(child)
+    else:
+        yield predicate
+
+
+def split(predicate):
+    """
+    Split a predicate into the part SQL can evaluate and a Python residual.
+
+    Returns (where_sql, params, residual) where where_sql is '' when nothing
+    can be pushed down and residual is None when nothing is left for Python.
+    The children of a top-level AND are pushed down independently; an OR is
+    pushed down only if every branch can be.
+    """
+    if predicate is None:
+        return '', [], None
+    pushed, residual = [], []
+    for part in _conjuncts(predicate):
+        compiled = part.to_sql()
+        if compiled is None:
+            residual.append(part)
+        else:
+            pushed.append(compiled)
+
+    where_sql, params = _join('AND', pushed) if pushed else ('', [])
+    if not residual:
+        rest = None
+    elif len(residual) == 1:
+        rest = residual[0]
+    else:
+        rest = And(*residual)
+    return where_sql, params, rest
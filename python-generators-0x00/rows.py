@@ -0,0 +1,85 @@
+import sys
+import time
+import tracemalloc
+
+# Column list used whenever rows are built by a row factory, so the
+# positional order always matches UserRow regardless of the table layout.
+USER_COLUMNS = "user_id, name, email, age"
+
+
+class UserRow:
+    """
+    Compact user record: fixed slots instead of a per-row dict.
+    Supports attribute access (row.age) and key access (row['age']).
+    """
+
+    __slots__ = ('user_id', 'name', 'email', 'age')
+
+    def __init__(self, user_id, name, email, age):
+        self.user_id = user_id
+        self.name = name
+        self.email = email
+        self.age = age
+
+    def __getitem__(self, key):
+        if key not in self.__slots__:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def keys(self):
+        return self.__slots__
+
+    def values(self):
+        return [getattr(self, key) for key in self.__slots__]
+
+    def as_dict(self):
+        return {key: getattr(self, key) for key in self.__slots__}
+
+    def __eq__(self, other):
+        if not isinstance(other, UserRow):
+            return NotImplemented
+        return all(getattr(self, k) == getattr(other, k) for k in self.__slots__)
+
+    def __repr__(self):
+        fields = ', '.join(f"{k}={getattr(self, k)!r}" for k in self.__slots__)
+        return f"UserRow({fields})"
+
+
+def row_bytes(row):
+    """Approximate in-memory size of one row (dict, UserRow or tuple)."""
+    values = row.values() if hasattr(row, 'values') else row
+    return sys.getsizeof(row) + sum(sys.getsizeof(v) for v in values)
+
+
+def apply_row_factory(rows, row_factory):
+    """Convert a list of positional tuples with the given factory."""
+    return [row_factory(*row) for row in rows]
+
+
+def benchmark(count=200_000):
+    """
+    Compare building 'count' rows as dicts (what cursor(dictionary=True)
+    does) against UserRow objects, reporting time and retained memory.
+    """
+    names = USER_COLUMNS.split(', ')
+    raw = [(f"{i:036d}", f"User {i}", f"user{i}@example.com", i % 100)
+           for i in range(count)]
+    results = {}
+    for label, build in (
+        ('dict', lambda: [dict(zip(names, r)) for r in raw]),
+        ('UserRow', lambda: apply_row_factory(raw, UserRow)),
+    ):
+        tracemalloc.start()
+        start = time.perf_counter()
+        rows = build()
+        elapsed = time.perf_counter() - start
+        retained, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del rows
+        results[label] = (elapsed, retained)
+        print(f"{label:8} {elapsed * 1000:8.1f} ms  {retained / count:6.1f} bytes/row")
+    return results
+
+
+if __name__ == "__main__":
+    benchmark()
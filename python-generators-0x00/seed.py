@@ -1,5 +1,11 @@
 import csv
+import io
+import mmap
+import os
+import sys
+import time
 import uuid
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
 import mysql.connector
 from mysql.connector import Error
 
@@ -19,26 +25,145 @@ def connect_to_prodev():
         print(f"❌ Error: {e}")
         return None
 
-def create_table(connection):
-    """Create the user_data table if it doesn't exist."""
+# Column types for the two supported key layouts.
+KEY_LAYOUTS = {
+    # Random uuid4 text keys, the original layout.
+    False: {'user_id': 'VARCHAR(36)', 'age': 'DECIMAL(3, 0)'},
+    # Time-ordered uuid7 keys packed into 16 bytes, appended to the
+    # clustered index instead of splitting random pages.
+    True: {'user_id': 'BINARY(16)', 'age': 'TINYINT UNSIGNED'},
+}
+
+def table_ddl(table='user_data', binary_ids=False):
+    """Return the CREATE TABLE statement for the chosen key layout."""
+    types = KEY_LAYOUTS[binary_ids]
+    return f"""
+        CREATE TABLE IF NOT EXISTS {table} (
+            user_id {types['user_id']} PRIMARY KEY,
+            name VARCHAR(255) NOT NULL,
+            email VARCHAR(255) NOT NULL,
+            age {types['age']} NOT NULL,
+            updated_at TIMESTAMP(6) NOT NULL
+                DEFAULT CURRENT_TIMESTAMP(6) ON UPDATE CURRENT_TIMESTAMP(6),
+            UNIQUE INDEX(email),
+            INDEX idx_{table}_updated (updated_at, user_id)
+        );
+    """
+
+def create_table(connection, binary_ids=False):
+    """
+    Create the user_data table if it doesn't exist.
+    With binary_ids=True user_id is a BINARY(16) uuid7 and age a TINYINT;
+    configure db_pool with binary_ids=True so the generators convert back.
+    """
     try:
         cursor = connection.cursor()
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS user_data (
-                user_id VARCHAR(36) PRIMARY KEY,
-                name VARCHAR(255) NOT NULL,
-                email VARCHAR(255) NOT NULL,
-                age DECIMAL(3, 0) NOT NULL,
-                INDEX(email)
-            );
-        """)
+        cursor.execute(table_ddl(binary_ids=binary_ids))
         connection.commit()
         print("✅ Table 'user_data' ensured.")
     except Error as e:
         print(f"❌ Failed to create table: {e}")
 
-def insert_data(connection, data):
-    """Insert one row of data if email doesn't already exist."""
+def uuid7():
+    """
+    Generate a time-ordered UUID (version 7): a 48-bit millisecond timestamp
+    followed by random bits, so new keys sort after existing ones.
+    """
+    value = (time.time_ns() // 1_000_000) << 80
+    value |= int.from_bytes(os.urandom(10), 'big')
+    value &= ~(0xF << 76)
+    value |= 0x7 << 76  # version
+    value &= ~(0x3 << 62)
+    value |= 0x2 << 62  # RFC 4122 variant
+    return uuid.UUID(int=value)
+
+def new_user_id(binary_ids=False):
+    """Return a fresh key for the chosen layout."""
+    return uuid7().bytes if binary_ids else str(uuid.uuid4())
+
+def ensure_change_tracking(connection):
+    """
+    Add the updated_at column and its index to a user_data table created
+    before change tracking existed. Does nothing if the column is present.
+    """
+    try:
+        cursor = connection.cursor()
+        cursor.execute("""
+            SELECT COUNT(*) FROM information_schema.COLUMNS
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'user_data'
+              AND COLUMN_NAME = 'updated_at'
+        """)
+        if cursor.fetchone()[0] == 0:
+            cursor.execute("""
+                ALTER TABLE user_data
+                    ADD COLUMN updated_at TIMESTAMP(6) NOT NULL
+                        DEFAULT CURRENT_TIMESTAMP(6) ON UPDATE CURRENT_TIMESTAMP(6),
+                    ADD INDEX idx_user_data_updated (updated_at, user_id)
+            """)
+            connection.commit()
+            print("✅ Added change tracking to 'user_data'.")
+    except Error as e:
+        print(f"❌ Failed to add change tracking: {e}")
+
+def ensure_unique_email(connection):
+    """
+    Make sure user_data has a unique index on email, which the bulk loaders
+    rely on to skip duplicates. Tables created before it existed have a plain
+    INDEX(email); that index is replaced by a unique one if the table holds
+    no duplicate emails yet. Returns True if the unique index is in place.
+    """
+    try:
+        cursor = connection.cursor()
+        cursor.execute("""
+            SELECT INDEX_NAME, MIN(NON_UNIQUE), COUNT(*) FROM information_schema.STATISTICS
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'user_data'
+            GROUP BY INDEX_NAME
+            HAVING SUM(COLUMN_NAME = 'email' AND SEQ_IN_INDEX = 1) = 1
+        """)
+        indexes = cursor.fetchall()
+        if any(non_unique == 0 and columns == 1 for _, non_unique, columns in indexes):
+            return True
+
+        cursor.execute("SELECT email FROM user_data GROUP BY email HAVING COUNT(*) > 1 LIMIT 1")
+        duplicate = cursor.fetchone()
+        if duplicate:
+            print(f"❌ Cannot add a unique email index, duplicate emails exist "
+                  f"(e.g. {duplicate[0]}). Remove them and re-run.")
+            return False
+        drops = ''.join(f"DROP INDEX `{name}`, " for name, non_unique, columns in indexes
+                        if non_unique == 1 and columns == 1)
+        cursor.execute(f"ALTER TABLE user_data {drops}ADD UNIQUE INDEX email (email)")
+        connection.commit()
+        print("✅ Added a unique email index to 'user_data'.")
+        return True
+    except Error as e:
+        print(f"❌ Failed to add a unique email index: {e}")
+        return False
+
+REQUIRED_COLUMNS = ('name', 'email', 'age')
+
+def validate_row(name, email, age, binary_ids=False):
+    """
+    Check one CSV row against the column types of the chosen layout and
+    return an insert-ready (user_id, name, email, age) tuple, or None if the
+    row would be rejected or silently altered by the database.
+    """
+    max_age = 255 if binary_ids else 999  # TINYINT UNSIGNED vs DECIMAL(3, 0)
+    try:
+        name, email, age = name.strip(), email.strip(), int(age)
+    except (AttributeError, ValueError):
+        return None
+    if not name or '@' not in email or not 0 <= age <= max_age:
+        return None
+    if len(name) > 255 or len(email) > 255:  # VARCHAR(255)
+        return None
+    return (new_user_id(binary_ids), name, email, age)
+
+def insert_data(connection, data, binary_ids=False):
+    """
+    Insert one row of data if email doesn't already exist.
+    Pass binary_ids=True for a table created with create_table(binary_ids=True).
+    """
     try:
         cursor = connection.cursor()
         query = "SELECT COUNT(*) FROM user_data WHERE email = %s"
@@ -51,7 +176,7 @@ def insert_data(connection, data):
                 VALUES (%s, %s, %s, %s);
             """
             cursor.execute(insert_query, (
-                str(uuid.uuid4()),  # Generate UUID
+                new_user_id(binary_ids),  # Generate UUID
                 data['name'],
                 data['email'],
                 data['age']
@@ -64,22 +189,254 @@ def insert_data(connection, data):
     except Error as e:
         print(f"❌ Error inserting data: {e}")
 
-def seed_from_csv(connection, file_path='user_data.csv'):
+def seed_from_csv(connection, file_path='user_data.csv', binary_ids=False):
     """Read data from CSV and insert into the database."""
     try:
         with open(file_path, mode='r') as file:
             reader = csv.DictReader(file)
             for row in reader:
-                insert_data(connection, row)
+                insert_data(connection, row, binary_ids)
     except FileNotFoundError:
         print("❌ CSV file not found.")
     except Exception as e:
         print(f"❌ Error reading CSV: {e}")
 
+BULK_INSERT_QUERY = """
+    INSERT IGNORE INTO user_data (user_id, name, email, age)
+    VALUES (%s, %s, %s, %s)
+"""
+
+def insert_batch(connection, rows):
+    """
+    Insert a list of (user_id, name, email, age) tuples in one transaction.
+    Rows whose email already exists are skipped by the database through the
+    unique email index. INSERT IGNORE would also turn bad values into
+    warnings, so rows must already have passed validate_row.
+    Returns the number of rows actually inserted.
+    """
+    cursor = connection.cursor()
+    try:
+        cursor.executemany(BULK_INSERT_QUERY, rows)
+        inserted = cursor.rowcount
+        connection.commit()
+        return inserted
+    except Error:
+        connection.rollback()
+        raise
+    finally:
+        cursor.close()
+
+def read_csv_chunks(file_path, chunk_size, binary_ids=False):
+    """
+    Yield (rows, rejected) for every chunk_size CSV rows: the rows that pass
+    validate_row as insert-ready tuples, and how many did not.
+    Raises ValueError if a required column is missing from the header.
+    """
+    with open(file_path, mode='r', newline='') as file:
+        reader = csv.DictReader(file)
+        missing = [c for c in REQUIRED_COLUMNS if c not in (reader.fieldnames or ())]
+        if missing:
+            raise ValueError(f"CSV header is missing column(s): {', '.join(missing)}")
+        chunk, rejected = [], 0
+        for row in reader:
+            valid = validate_row(row['name'], row['email'], row['age'], binary_ids)
+            if valid is None:
+                rejected += 1
+            else:
+                chunk.append(valid)
+            if len(chunk) + rejected == chunk_size:
+                yield chunk, rejected
+                chunk, rejected = [], 0
+        if chunk or rejected:
+            yield chunk, rejected
+
+def bulk_seed_from_csv(connection, file_path='user_data.csv', chunk_size=5000, binary_ids=False):
+    """
+    Seed the table from CSV in chunks: one executemany and one commit per
+    chunk instead of a probe, an insert and a commit per row. Safe to re-run,
+    duplicate emails are ignored by the database through the unique email
+    index, so nothing is loaded unless that index is in place. Rows that
+    fail validation are counted and skipped.
+    Returns (rows_read, rows_inserted).
+    """
+    read = inserted = rejected = 0
+    if not ensure_unique_email(connection):
+        print("❌ Refusing to bulk-load without a unique email index.")
+        return read, inserted
+    start = time.perf_counter()
+    try:
+        for chunk, bad in read_csv_chunks(file_path, chunk_size, binary_ids):
+            if chunk:
+                inserted += insert_batch(connection, chunk)
+            read += len(chunk) + bad
+            rejected += bad
+    except FileNotFoundError:
+        print("❌ CSV file not found.")
+    except ValueError as e:
+        print(f"❌ Error reading CSV: {e}")
+    except Error as e:
+        print(f"❌ Bulk insert failed after {inserted} rows: {e}")
+    elapsed = time.perf_counter() - start
+    rate = read / elapsed if elapsed > 0 else 0.0
+    print(f"✅ Bulk seeded {inserted} new of {read} rows ({rejected} rejected) "
+          f"in {elapsed:.2f}s ({rate:,.0f} rows/sec)")
+    return read, inserted
+
+def split_csv_ranges(file_path, range_bytes=8 * 1024 * 1024):
+    """
+    Memory-map the CSV and cut the body (after the header) into byte ranges
+    of about range_bytes, each ending on a line boundary.
+    Returns (header_fields, [(start, end), ...]); an empty file gives ([], [])
+    and a file with only a header line gives no ranges.
+    Fields must not contain embedded newlines.
+    """
+    if os.path.getsize(file_path) == 0:
+        return [], []  # mmap cannot map an empty file
+    with open(file_path, 'rb') as file, \
+            mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        size = len(mm)
+        newline = mm.find(b'\n')
+        body_start = size if newline == -1 else newline + 1
+        header = next(csv.reader([mm[:body_start].decode('utf-8-sig').rstrip('\r\n')]), [])
+        ranges = []
+        start = body_start
+        while start < size:
+            end = mm.find(b'\n', min(start + range_bytes, size - 1))
+            end = size if end == -1 else end + 1
+            ranges.append((start, end))
+            start = end
+    return header, ranges
+
+def _parse_csv_range(file_path, start, end, header, binary_ids):
+    """
+    Worker: parse and validate one byte range of the CSV.
+    Returns (rows, rejected) where rows are insert-ready tuples.
+    """
+    with open(file_path, 'rb') as file, \
+            mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        text = mm[start:end].decode('utf-8')
+    name_i, email_i, age_i = (header.index(c) for c in REQUIRED_COLUMNS)
+    rows, rejected = [], 0
+    for fields in csv.reader(io.StringIO(text)):
+        try:
+            valid = validate_row(fields[name_i], fields[email_i], fields[age_i], binary_ids)
+        except IndexError:
+            valid = None
+        if valid is None:
+            rejected += 1
+        else:
+            rows.append(valid)
+    return rows, rejected
+
+def parallel_seed_from_csv(connection, file_path='user_data.csv', workers=None,
+                           chunk_size=5000, range_bytes=8 * 1024 * 1024, binary_ids=False):
+    """
+    Seed the table with CSV parsing spread over worker processes.
+
+    The file is split into line-aligned byte ranges that workers parse and
+    validate independently, while this process is the single writer and
+    inserts their rows through insert_batch. At most two ranges per worker
+    are in flight, so memory stays bounded for any file size.
+    Returns (rows_inserted, rows_rejected).
+    """
+    workers = workers or os.cpu_count() or 1
+    inserted = rejected = parsed = 0
+    if not ensure_unique_email(connection):
+        print("❌ Refusing to bulk-load without a unique email index.")
+        return inserted, rejected
+    start_time = time.perf_counter()
+    try:
+        header, ranges = split_csv_ranges(file_path, range_bytes)
+    except FileNotFoundError:
+        print("❌ CSV file not found.")
+        return 0, 0
+    except (OSError, UnicodeDecodeError) as e:
+        print(f"❌ Error reading CSV: {e}")
+        return 0, 0
+    missing = [c for c in REQUIRED_COLUMNS if c not in header]
+    if missing:
+        print(f"❌ Error reading CSV: header is missing column(s): {', '.join(missing)}")
+        return 0, 0
+
+    pending_ranges = iter(ranges)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        in_flight = set()
+        try:
+            while True:
+                while len(in_flight) < workers * 2:
+                    byte_range = next(pending_ranges, None)
+                    if byte_range is None:
+                        break
+                    in_flight.add(pool.submit(_parse_csv_range, file_path,
+                                              *byte_range, header, binary_ids))
+                if not in_flight:
+                    break
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    rows, bad = future.result()
+                    rejected += bad
+                    parsed += len(rows)
+                    for i in range(0, len(rows), chunk_size):
+                        inserted += insert_batch(connection, rows[i:i + chunk_size])
+        except Error as e:
+            print(f"❌ Parallel insert failed after {inserted} rows: {e}")
+            for future in in_flight:
+                future.cancel()
+        except Exception as e:
+            # Raised by a worker through future.result(), e.g. a decode error.
+            print(f"❌ Parsing CSV failed after {inserted} rows: {e!r}")
+            for future in in_flight:
+                future.cancel()
+
+    elapsed = time.perf_counter() - start_time
+    rate = parsed / elapsed if elapsed > 0 else 0.0
+    print(f"✅ Parallel seeded {inserted} new of {parsed} valid rows "
+          f"({rejected} rejected) in {elapsed:.2f}s ({rate:,.0f} rows/sec)")
+    return inserted, rejected
+
+def compare_key_layouts(connection, rows=100_000, chunk_size=5000):
+    """
+    Benchmark insert throughput and on-disk size of the uuid4/VARCHAR layout
+    against the uuid7/BINARY(16) layout using two scratch tables.
+    Returns {layout: {'rows_per_sec', 'data_bytes', 'index_bytes'}}.
+    """
+    results = {}
+    cursor = connection.cursor()
+    for binary_ids, label in ((False, 'uuid4_varchar'), (True, 'uuid7_binary')):
+        table = f"user_data_bench_{label}"
+        cursor.execute(f"DROP TABLE IF EXISTS {table}")
+        cursor.execute(table_ddl(table, binary_ids))
+        query = BULK_INSERT_QUERY.replace('user_data', table)
+        start = time.perf_counter()
+        for first in range(0, rows, chunk_size):
+            batch = [(new_user_id(binary_ids), f"User {i}", f"user{i}@example.com", i % 100)
+                     for i in range(first, min(first + chunk_size, rows))]
+            cursor.executemany(query, batch)
+            connection.commit()
+        elapsed = time.perf_counter() - start
+        cursor.execute(f"ANALYZE TABLE {table}")
+        cursor.fetchall()
+        cursor.execute(
+            "SELECT DATA_LENGTH, INDEX_LENGTH FROM information_schema.TABLES "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s", (table,)
+        )
+        data_bytes, index_bytes = cursor.fetchone()
+        cursor.execute(f"DROP TABLE {table}")
+        results[label] = {'rows_per_sec': rows / elapsed,
+                          'data_bytes': data_bytes, 'index_bytes': index_bytes}
+        print(f"📊 {label:14} {rows / elapsed:10,.0f} rows/sec  "
+              f"data {data_bytes / 1e6:7.1f} MB  indexes {index_bytes / 1e6:7.1f} MB")
+    cursor.close()
+    return results
+
 if __name__ == "__main__":
     conn = connect_to_prodev()
-    if conn:
+    if conn and '--compare-keys' in sys.argv:
+        compare_key_layouts(conn)
+        conn.close()
+    elif conn:
         create_table(conn)
-        seed_from_csv(conn)
+        ensure_change_tracking(conn)
+        bulk_seed_from_csv(conn)
         conn.close()
 
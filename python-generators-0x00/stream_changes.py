@@ -0,0 +1,77 @@
+import json
+import os
+from datetime import datetime
+
+from mysql.connector import Error
+
+import db_pool
+from managed import managed_stream
+
+WATERMARK_FILE = '.user_data_watermark.json'
+
+
+def load_watermark(path=WATERMARK_FILE):
+    """Return the saved (updated_at, user_id) position, or None on the first run."""
+    try:
+        with open(path) as file:
+            state = json.load(file)
+    except FileNotFoundError:
+        return None
+    return datetime.fromisoformat(state['updated_at']), state['user_id']
+
+
+def save_watermark(position, path=WATERMARK_FILE):
+    """Persist the (updated_at, user_id) position atomically."""
+    updated_at, user_id = position
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as file:
+        json.dump({'updated_at': updated_at.isoformat(), 'user_id': str(user_id)}, file)
+    os.replace(tmp_path, path)
+
+
+@managed_stream
+def stream_changes(path=WATERMARK_FILE, chunk_size=1000, settle_seconds=1.0):
+    """
+    Generator that yields only the users inserted or updated since the last
+    run, in (updated_at, user_id) order, using the updated_at index.
+
+    The watermark is saved after each chunk has been fully consumed, so a
+    consumer that stops early sees the unfinished chunk again next time
+    (at-least-once delivery). Rows newer than 'settle_seconds' are left for
+    the next run, giving in-flight transactions time to commit so their
+    timestamps cannot land behind the watermark. Deletes are not reported.
+    """
+    position = load_watermark(path)
+    try:
+        with db_pool.connection() as connection, \
+                db_pool.open_cursor(connection, dictionary=True) as cursor:
+            while True:
+                params = [int(settle_seconds * 1_000_000)]
+                where = "updated_at < NOW(6) - INTERVAL %s MICROSECOND"
+                if position is not None:
+                    where += " AND (updated_at, user_id) > (%s, %s)"
+                    params.extend([position[0], db_pool.user_id_param(position[1])])
+                cursor.execute(
+                    f"SELECT * FROM user_data WHERE {where} "
+                    "ORDER BY updated_at, user_id LIMIT %s;",
+                    params + [chunk_size]
+                )
+                rows = cursor.fetchall()
+                if not rows:
+                    break
+                yield from rows
+                position = (rows[-1]['updated_at'], rows[-1]['user_id'])
+                save_watermark(position, path)
+                # End the read snapshot so the next chunk sees fresh commits.
+                connection.commit()
+
+    except Error as e:
+        print(f"❌ Error while streaming changes: {e}")
+
+
+if __name__ == "__main__":
+    changed = 0
+    for user in stream_changes():
+        changed += 1
+        print(f"🆕 {user['name']} | 📧 {user['email']} | 🕒 {user['updated_at']}")
+    print(f"{changed} changed users since the last run.")
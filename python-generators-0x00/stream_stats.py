@@ -0,0 +1,194 @@
+import math
+
+
+class RunningStats:
+    """
+    One-pass count, mean, variance (Welford), min and max in O(1) memory.
+    Two instances built over different partitions can be combined with merge().
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+        self.min = None
+        self.max = None
+
+    def add(self, x):
+        x = float(x)
+        self.count += 1
+        delta = x - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (x - self.mean)
+        if self.min is None or x < self.min:
+            self.min = x
+        if self.max is None or x > self.max:
+            self.max = x
+
+    def merge(self, other):
+        """Fold another RunningStats into this one (Chan et al.)."""
+        if other.count == 0:
+            return self
+        if self.count == 0:
+            self.count, self.mean, self._m2 = other.count, other.mean, other._m2
+            self.min, self.max = other.min, other.max
+            return self
+        total = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / total
+        self._m2 += other._m2 + delta * delta * self.count * other.count / total
+        self.count = total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
+
+    @property
+    def variance(self):
+        """Sample variance, matching SQL VAR_SAMP."""
+        return self._m2 / (self.count - 1) if self.count > 1 else None
+
+    @property
+    def stddev(self):
+        """Sample standard deviation, matching SQL STDDEV_SAMP."""
+        var = self.variance
+        return math.sqrt(var) if var is not None else None
+
+
+class Histogram:
+    """Fixed-width histogram; memory grows with the number of distinct bins only."""
+
+    def __init__(self, bin_width=10):
+        self.bin_width = bin_width
+        self.bins = {}
+
+    def add(self, x):
+        key = math.floor(float(x) / self.bin_width) * self.bin_width
+        self.bins[key] = self.bins.get(key, 0) + 1
+
+    def merge(self, other):
+        if other.bin_width != self.bin_width:
+            raise ValueError("Cannot merge histograms with different bin widths")
+        for key, count in other.bins.items():
+            self.bins[key] = self.bins.get(key, 0) + count
+        return self
+
+    def items(self):
+        """Return [(bin_start, count), ...] in ascending order."""
+        return sorted(self.bins.items())
+
+
+class TDigest:
+    """
+    Merging t-digest for approximate quantiles.
+
+    Keeps at most roughly 'compression' centroids, so memory is bounded no
+    matter how many values are added, and accuracy is best at the tails.
+    """
+
+    def __init__(self, compression=100):
+        self.compression = compression
+        self.count = 0
+        self.min = None
+        self.max = None
+        self._centroids = []  # [mean, weight], sorted by mean after _compress
+        self._buffer = []
+
+    def add(self, x, weight=1):
+        x = float(x)
+        self._buffer.append([x, weight])
+        self.count += weight
+        if self.min is None or x < self.min:
+            self.min = x
+        if self.max is None or x > self.max:
+            self.max = x
+        if len(self._buffer) >= self.compression * 5:
+            self._compress()
+
+    def merge(self, other):
+        other._compress()
+        self._buffer.extend([m, w] for m, w in other._centroids)
+        self.count += other.count
+        if other.min is not None:
+            self.min = other.min if self.min is None else min(self.min, other.min)
+            self.max = other.max if self.max is None else max(self.max, other.max)
+        self._compress()
+        return self
+
+    def _k(self, q):
+        q = min(max(q, 0.0), 1.0)
+        return self.compression / (2 * math.pi) * math.asin(2 * q - 1)
+
+    def _compress(self):
+        if not self._buffer:
+            return
+        points = sorted(self._centroids + self._buffer)
+        self._buffer = []
+        total = float(self.count)
+        merged = []
+        mean, weight = points[0]
+        done = 0.0
+        k_left = self._k(0.0)
+        for m, w in points[1:]:
+            if self._k((done + weight + w) / total) - k_left <= 1:
+                weight += w
+                mean += (m - mean) * w / weight
+            else:
+                merged.append([mean, weight])
+                done += weight
+                k_left = self._k(done / total)
+                mean, weight = m, w
+        merged.append([mean, weight])
+        self._centroids = merged
+
+    def quantile(self, q):
+        """Approximate value at quantile q (0 <= q <= 1), or None if empty."""
+        self._compress()
+        if not self._centroids:
+            return None
+        if len(self._centroids) == 1:
+            return self._centroids[0][0]
+        target = q * self.count
+        # Each centroid is treated as centred at cumulative weight + w/2.
+        prev_pos, prev_mean = 0.0, self.min
+        cumulative = 0.0
+        for mean, weight in self._centroids:
+            pos = cumulative + weight / 2
+            if target <= pos:
+                if pos == prev_pos:
+                    return mean
+                frac = (target - prev_pos) / (pos - prev_pos)
+                return prev_mean + frac * (mean - prev_mean)
+            prev_pos, prev_mean = pos, mean
+            cumulative += weight
+        if cumulative == prev_pos:
+            return self.max
+        frac = (target - prev_pos) / (cumulative - prev_pos)
+        return prev_mean + frac * (self.max - prev_mean)
+
+
+class StreamSummary:
+    """Bundle of RunningStats, Histogram and TDigest fed from one pass."""
+
+    def __init__(self, bin_width=10, compression=100):
+        self.stats = RunningStats()
+        self.histogram = Histogram(bin_width)
+        self.digest = TDigest(compression)
+
+    def add(self, x):
+        self.stats.add(x)
+        self.histogram.add(x)
+        self.digest.add(x)
+
+    def extend(self, values):
+        for x in values:
+            self.add(x)
+        return self
+
+    def merge(self, other):
+        self.stats.merge(other.stats)
+        self.histogram.merge(other.histogram)
+        self.digest.merge(other.digest)
+        return self
+
+    def quantiles(self, qs=(0.5, 0.9, 0.99)):
+        return {q: self.digest.quantile(q) for q in qs}
@@ -0,0 +1,138 @@
+"""
+Stress check for early exit in the streaming generators.
+
+Runs thousands of streams against a tiny pool of in-memory fake connections
+and abandons them in every way a consumer can (break, exception inside a
+'with' block, close() after one item). With a pool of two connections any
+leaked checkout shows up as a PoolTimeout within a few iterations.
+
+    python3 stress_cleanup.py
+"""
+import importlib
+import random
+
+import db_pool
+
+stream_users = importlib.import_module('0-stream_users').stream_users
+stream_users_in_batches = importlib.import_module('1-batch_processing').stream_users_in_batches
+lazy_paginate = importlib.import_module('2-lazy_paginate').lazy_paginate
+stream_user_ages = importlib.import_module('4-stream_ages').stream_user_ages
+
+ROWS = [(f"{i:036d}", f"User {i}", f"user{i}@example.com", i % 90) for i in range(500)]
+NAMES = ('user_id', 'name', 'email', 'age')
+
+
+class FakeCursor:
+    def __init__(self, connection, dictionary=False, buffered=None):
+        self.connection = connection
+        self.dictionary = dictionary
+        self.column_names = NAMES
+        self._rows = iter(())
+
+    def execute(self, query, params=()):
+        rows = ROWS
+        if "OFFSET" in query:
+            limit, offset = params
+            rows = ROWS[offset:offset + limit]
+        if "SELECT age" in query:
+            rows = [(r[3],) for r in rows]
+        elif self.dictionary:
+            rows = [dict(zip(NAMES, r)) for r in rows]
+        self._rows = iter(rows)
+        self.connection.unread_result = True
+
+    def _fetch(self, n):
+        rows = [row for _, row in zip(range(n), self._rows)]
+        if len(rows) < n:
+            self.connection.unread_result = False
+        return rows
+
+    def fetchmany(self, size=1):
+        return self._fetch(size)
+
+    def fetchall(self):
+        return self._fetch(len(ROWS) + 1)
+
+    def __iter__(self):
+        while True:
+            rows = self._fetch(1)
+            if not rows:
+                return
+            yield rows[0]
+
+    def close(self):
+        if self.connection.unread_result:
+            raise db_pool.Error(msg="Unread result found")
+
+
+class FakeConnection:
+    open_count = 0
+
+    def __init__(self):
+        FakeConnection.open_count += 1
+        self.unread_result = False
+        self._open = True
+
+    def cursor(self, **options):
+        return FakeCursor(self, **options)
+
+    def ping(self, reconnect=False):
+        if not self._open:
+            raise db_pool.Error(msg="closed")
+
+    def is_connected(self):
+        return self._open
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        if self._open:
+            self._open = False
+            FakeConnection.open_count -= 1
+
+
+def _break_early(stream):
+    for _ in stream:
+        break
+
+
+def _raise_inside(stream):
+    try:
+        with stream as rows:
+            for _ in rows:
+                raise RuntimeError("consumer failed")
+    except RuntimeError:
+        pass
+
+
+def _close_after_one(stream):
+    next(stream, None)
+    stream.close()
+
+
+def run(iterations=5000, pool_size=2):
+    pool = db_pool.configure(max_size=pool_size, timeout=1, connect=FakeConnection)
+    factories = [
+        lambda: stream_users(),
+        lambda: stream_users(stream=True, chunk_size=50),
+        lambda: stream_users_in_batches(25),
+        lambda: stream_users_in_batches(25, columnar=True),
+        lambda: lazy_paginate(20),
+        lambda: lazy_paginate(20, prefetch=2),
+        lambda: stream_user_ages(),
+    ]
+    exits = [_break_early, _raise_inside, _close_after_one]
+    for _ in range(iterations):
+        random.choice(exits)(random.choice(factories)())
+
+    stats = pool.stats()
+    assert stats['in_use'] == 0, f"leaked checkouts: {stats}"
+    assert FakeConnection.open_count <= pool_size, \
+        f"{FakeConnection.open_count} connections left open"
+    print(f"✅ {iterations} abandoned streams, pool {stats}, "
+          f"open connections {FakeConnection.open_count}")
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,58 @@
+import unittest
+
+from predicates import And, Or, Predicate, split
+
+
+def is_even(value, _):
+    return value % 2 == 0
+
+
+class TestSplit(unittest.TestCase):
+    """split() pushes what SQL can evaluate down and leaves the rest to Python."""
+
+    def test_none(self):
+        self.assertEqual(split(None), ('', [], None))
+
+    def test_fully_pushed_down(self):
+        where, params, residual = split(Predicate('age', '>', 25) & Predicate('name', 'like', 'A%'))
+        self.assertEqual(where, '(age > %s) AND (name LIKE %s)')
+        self.assertEqual(params, [25, 'A%'])
+        self.assertIsNone(residual)
+
+    def test_python_only_conjunct_is_the_residual(self):
+        odd_one = Predicate('age', is_even)
+        where, params, residual = split(Predicate('age', '>', 25) & odd_one)
+        self.assertEqual(where, '(age > %s)')
+        self.assertEqual(params, [25])
+        self.assertIs(residual, odd_one)
+
+    def test_several_residuals_are_combined_with_and(self):
+        where, params, residual = split(Predicate('age', is_even) & Predicate('age', '<', 90)
+                                        & Predicate('name', lambda name, _: name.startswith('J')))
+        self.assertEqual((where, params), ('(age < %s)', [90]))
+        self.assertIsInstance(residual, And)
+        self.assertTrue(residual.matches({'age': 40, 'name': 'Jane'}))
+        self.assertFalse(residual.matches({'age': 41, 'name': 'Jane'}))
+
+    def test_or_with_a_python_branch_stays_in_python(self):
+        predicate = Predicate('age', '>', 25) | Predicate('age', is_even)
+        where, params, residual = split(predicate)
+        self.assertEqual((where, params), ('', []))
+        self.assertIsInstance(residual, Or)
+        self.assertIs(residual, predicate)
+
+    def test_nested_and_or(self):
+        predicate = ((Predicate('age', '>', 60) | Predicate('age', '<', 20))
+                     & Predicate('email', 'in', ['a@x.com', 'b@x.com']))
+        where, params, residual = split(predicate)
+        self.assertEqual(where, '((age > %s) OR (age < %s)) AND (email IN (%s, %s))')
+        self.assertEqual(params, [60, 20, 'a@x.com', 'b@x.com'])
+        self.assertIsNone(residual)
+
+    def test_invalid_column_is_rejected(self):
+        with self.assertRaises(ValueError):
+            Predicate('age; DROP TABLE user_data', '=', 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+import random
+import statistics
+import unittest
+
+from stream_stats import RunningStats, TDigest
+
+
+def running_stats(values):
+    stats = RunningStats()
+    for x in values:
+        stats.add(x)
+    return stats
+
+
+def digest(values, compression=100):
+    d = TDigest(compression)
+    for x in values:
+        d.add(x)
+    return d
+
+
+class TestRunningStatsMerge(unittest.TestCase):
+    """Merging per-partition stats gives the same answer as one pass."""
+
+    def setUp(self):
+        rng = random.Random(7)
+        self.values = [rng.gauss(40, 12) for _ in range(1000)]
+
+    def test_merge_matches_single_pass(self):
+        merged = running_stats(self.values[:300]).merge(running_stats(self.values[300:]))
+        self.assertEqual(merged.count, len(self.values))
+        self.assertAlmostEqual(merged.mean, statistics.mean(self.values))
+        self.assertAlmostEqual(merged.variance, statistics.variance(self.values))
+        self.assertEqual(merged.min, min(self.values))
+        self.assertEqual(merged.max, max(self.values))
+
+    def test_merge_with_empty(self):
+        full = running_stats(self.values)
+        self.assertAlmostEqual(RunningStats().merge(full).variance, full.variance)
+        self.assertEqual(full.merge(RunningStats()).count, len(self.values))
+
+    def test_empty_has_no_variance(self):
+        self.assertIsNone(RunningStats().variance)
+        self.assertIsNone(running_stats([3]).stddev)
+
+
+class TestTDigestMerge(unittest.TestCase):
+    """Merged digests keep the count, the extremes and the quantiles."""
+
+    def setUp(self):
+        rng = random.Random(11)
+        self.values = [rng.uniform(0, 1000) for _ in range(20_000)]
+
+    def test_merge_matches_single_digest(self):
+        parts = [digest(self.values[i::4]) for i in range(4)]
+        merged = parts[0]
+        for part in parts[1:]:
+            merged.merge(part)
+        whole = sorted(self.values)
+        self.assertEqual(merged.count, len(self.values))
+        self.assertEqual(merged.min, whole[0])
+        self.assertEqual(merged.max, whole[-1])
+        for q in (0.01, 0.5, 0.9, 0.99):
+            exact = whole[int(q * (len(whole) - 1))]
+            self.assertAlmostEqual(merged.quantile(q), exact, delta=10)
+
+    def test_centroids_stay_bounded(self):
+        merged = TDigest(50)
+        for i in range(10):
+            merged.merge(digest(self.values[i::10], 50))
+        self.assertLess(len(merged._centroids), 100)
+
+    def test_merge_into_empty(self):
+        merged = TDigest().merge(digest([5, 1, 9]))
+        self.assertEqual((merged.count, merged.min, merged.max), (3, 1, 9))
+        self.assertIsNone(TDigest().quantile(0.5))
+
+
+if __name__ == '__main__':
+    unittest.main()